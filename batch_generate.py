@@ -0,0 +1,82 @@
+"""
+Generate recipe cards (recipe text, image and PDF) for many products at once.
+
+    python batch_generate.py --category Lifestyle
+    python batch_generate.py --products "Adrenal Chill" "Berberine 500mg" --instructions vegan
+    python batch_generate.py --category Lifestyle --workers 16 --image-concurrency 4
+
+Products are processed by a bounded pool of async workers, with separate limits
+for concurrent LLM and image requests. Progress is checkpointed to
+<output>/manifest.json, so re-running an interrupted batch resumes it; finished
+PDFs are written to <output>/pdfs/. Recipes already in the recipe store are reused.
+"""
+import argparse
+import asyncio
+from functions.batchGenerator import products_for_categories, default_output_dir, run_batch
+from functions.product_details import product_categories
+from services.constants import (
+    BATCH_WORKERS,
+    BATCH_LLM_CONCURRENCY,
+    BATCH_IMAGE_CONCURRENCY,
+    BATCH_RETRIES,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate recipe cards in bulk.")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument(
+        "--category", nargs="+", choices=list(product_categories), help="product categories"
+    )
+    selection.add_argument("--products", nargs="+", help="product names")
+    parser.add_argument("--instructions", default="", help="custom recipe instructions")
+    parser.add_argument("--output", help="run folder (default: batch_runs/<selection>)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--image-concurrency", type=int, default=BATCH_IMAGE_CONCURRENCY)
+    parser.add_argument("--retries", type=int, default=BATCH_RETRIES)
+    parser.add_argument(
+        "--regenerate",
+        action="store_true",
+        help="ignore saved recipes and finished checkpoints and generate everything again",
+    )
+    return parser.parse_args()
+
+
+def report(finished, total, product, entry):
+    detail = entry.get("name") if entry["status"] == "done" else entry.get("error")
+    print(f"[{finished}/{total}] {product}: {entry['status']} ({detail})", flush=True)
+
+
+def main():
+    args = parse_args()
+    if args.category:
+        products = products_for_categories(args.category)
+        name = "-".join(args.category)
+    else:
+        products = list(dict.fromkeys(args.products))
+        name = "products-" + "-".join(products)[:60]
+    output_dir = args.output or default_output_dir(name)
+    manifest = asyncio.run(
+        run_batch(
+            products,
+            output_dir,
+            custom_instructions=args.instructions,
+            workers=args.workers,
+            llm_concurrency=args.llm_concurrency,
+            image_concurrency=args.image_concurrency,
+            retries=args.retries,
+            regenerate=args.regenerate,
+            progress=report,
+        )
+    )
+    print(
+        f"{manifest['done']} done, {manifest['failed']} failed in "
+        f"{manifest['duration_seconds']}s; summary in {output_dir}/manifest.json"
+    )
+    if manifest["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Microbenchmark: per-request agent setup cost, rebuilt vs shared executor.
+
+Run from the repository root:
+    python -m benchmarks.agent_setup_benchmark
+No LLM calls are made; only the retriever tool, prompt, agent and executor are built.
+"""
+import timeit
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+from functions.chains import build_agent_executor, get_agent_executor
+from services.prompt import system_prompt
+
+ROUNDS = 200
+
+
+def main():
+    knowledge_hub = FAISS.from_texts(
+        [f"chunk {i}" for i in range(100)], FakeEmbeddings(size=1536)
+    )
+    rebuilt = timeit.timeit(
+        lambda: build_agent_executor(system_prompt, knowledge_hub), number=ROUNDS
+    )
+    shared = timeit.timeit(
+        lambda: get_agent_executor("recipe", system_prompt, knowledge_hub), number=ROUNDS
+    )
+    print(f"rebuilt per request: {rebuilt / ROUNDS * 1e3:.3f} ms")
+    print(f"shared executor:     {shared / ROUNDS * 1e3:.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Build the FAISS knowledge base outside the Streamlit apps, e.g. in a deploy pipeline.
+
+    python build_index.py                 # full rebuild of faiss_index from docs/
+    python build_index.py --incremental   # only re-embed added/changed PDFs
+    python build_index.py --workers 8 --chunk-size 800 --output /srv/faiss_index
+    python build_index.py --index-factory "IVF1024,PQ64"   # approximate index
+    python build_index.py --recall-report --nprobe 32      # recall@k vs exact search
+    python build_index.py --list-versions
+    python build_index.py --rollback      # make the previous version live again
+
+Every build is written to a new version folder (faiss_index/v<timestamp>/) and only
+then made live by atomically updating faiss_index/CURRENT, so running apps never
+load a half-written index and switch to the new version on their next request.
+The last few versions are kept for rollback.
+"""
+import argparse
+import time
+from functions.recipeProcessor import (
+    build_knowledge_hub,
+    update_knowledge_hub,
+    index_vectors,
+    embeddings,
+)
+from functions.indexStore import current_version, current_version_path, list_versions, rollback
+from functions.chunkStore import load_knowledge_hub
+from functions.annIndex import is_flat_factory, recall_report, set_search_params
+from services.constants import (
+    DATA_FOLDER,
+    VECTOR_DB,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    INDEX_FACTORY,
+    INDEX_NPROBE,
+    INDEX_EF_SEARCH,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the Canprev knowledge base index.")
+    parser.add_argument("--docs", default=DATA_FOLDER, help="folder with the source PDFs")
+    parser.add_argument("--output", default=VECTOR_DB, help="index folder to write")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="PDF parsing processes (default: CPU count)"
+    )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument(
+        "--index-factory",
+        default=INDEX_FACTORY,
+        help='faiss index_factory string, e.g. "Flat", "HNSW32,Flat" or "IVF1024,PQ64"',
+    )
+    parser.add_argument(
+        "--recall-report",
+        action="store_true",
+        help="compare the live index with exact search instead of building",
+    )
+    parser.add_argument("--recall-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=INDEX_NPROBE, help="IVF lists to search")
+    parser.add_argument(
+        "--ef-search", type=int, default=INDEX_EF_SEARCH, help="HNSW search queue size"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-embed added or changed PDFs instead of rebuilding; an index "
+        "built with other chunk or index settings is rebuilt in full",
+    )
+    parser.add_argument(
+        "--list-versions", action="store_true", help="list the kept index versions"
+    )
+    parser.add_argument(
+        "--rollback",
+        type=int,
+        nargs="?",
+        const=1,
+        metavar="STEPS",
+        help="point the live index back to an older kept version (default: 1 step)",
+    )
+    return parser.parse_args()
+
+
+def report(batch, chunks):
+    print(f"  batch {batch}: {chunks} chunks embedded", flush=True)
+
+
+def print_recall(knowledge_hub, args):
+    set_search_params(knowledge_hub.index, args.nprobe, args.ef_search)
+    report = recall_report(knowledge_hub.index, index_vectors(knowledge_hub), args.recall_k)
+    print(
+        f"recall@{report['k']} vs flat: {report['recall']:.3f} "
+        f"({report['queries']} queries, nprobe={args.nprobe}, efSearch={args.ef_search}); "
+        f"{report['index_ms']:.3f} ms/query vs {report['flat_ms']:.3f} ms/query flat"
+    )
+
+
+def main():
+    args = parse_args()
+    if args.list_versions:
+        live = current_version(args.output)
+        for version in list_versions(args.output):
+            print(f"{version}{'  (live)' if version == live else ''}")
+        return
+    if args.rollback is not None:
+        try:
+            version = rollback(args.output, args.rollback)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"{args.output} now serves {version}")
+        return
+    if args.recall_report:
+        live_path = current_version_path(args.output)
+        if live_path is None:
+            raise SystemExit(f"No published index in {args.output}.")
+        print_recall(load_knowledge_hub(live_path, embeddings), args)
+        return
+    start = time.perf_counter()
+    if args.incremental:
+        changes = update_knowledge_hub(
+            progress=report,
+            max_workers=args.workers,
+            data_folder=args.docs,
+            index_path=args.output,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            index_factory=args.index_factory,
+        )
+        print(
+            f"Updated {args.output}: {len(changes['added'])} added, "
+            f"{len(changes['changed'])} changed, {len(changes['removed'])} removed"
+        )
+    else:
+        knowledge_hub = build_knowledge_hub(
+            progress=report,
+            max_workers=args.workers,
+            data_folder=args.docs,
+            index_path=args.output,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            index_factory=args.index_factory,
+        )
+        print(f"Built {args.output} with {knowledge_hub.index.ntotal} chunks")
+        if not is_flat_factory(args.index_factory):
+            print_recall(knowledge_hub, args)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import time
+import logging
+import numpy as np
+import faiss
+from services.constants import (
+    INDEX_FACTORY,
+    INDEX_TRAIN_SAMPLE,
+    INDEX_NPROBE,
+    INDEX_EF_SEARCH,
+)
+
+logger = logging.getLogger(__name__)
+
+# Index types are given as faiss.index_factory strings, for example:
+#   "Flat"          exact search, 6 KB per 1536-dim vector
+#   "HNSW32,Flat"   graph search, no training, full vectors plus the graph links
+#   "IVF1024,PQ64"  inverted lists with product quantization, 64 bytes per vector;
+#                   trained on a sample, searched in nprobe of the 1024 lists
+# All indexes use L2 distance, like the flat index the LangChain FAISS store creates.
+
+
+def is_flat_factory(factory):
+    return factory.strip().lower() == "flat"
+
+
+def set_search_params(index, nprobe=INDEX_NPROBE, ef_search=INDEX_EF_SEARCH):
+    """Apply the search-time speed/recall knobs that the index type supports."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # not an IVF index
+    return index
+
+
+def make_reconstructable(index):
+    """
+    Give IVF indexes a direct map from vector IDs to list entries. Without it they
+    cannot return stored vectors, which MMR search and candidate scoring need.
+    The map is saved with the index; loading adds it to indexes saved without one.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return index  # not an IVF index
+    if ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index
+
+
+def stores_exact_vectors(index):
+    """
+    True if the index keeps the vectors uncompressed, so reconstruct_n returns
+    them exactly: flat indexes, HNSW over flat storage and IVF over flat lists
+    (with the direct map from make_reconstructable). PQ and SQ codes are lossy.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, faiss.IndexIVFFlat):
+        return index.direct_map.type != faiss.DirectMap.NoMap
+    return isinstance(index, faiss.IndexFlat)
+
+
+def _disable_polysemous_training(index):
+    # PQ indexes default to polysemous training, which takes minutes and only
+    # helps Hamming-distance filtering that is not used here.
+    try:
+        index = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        pass
+    index = faiss.downcast_index(index)
+    if hasattr(index, "do_polysemous_training"):
+        index.do_polysemous_training = False
+
+
+def build_index(vectors, factory=INDEX_FACTORY, train_sample=INDEX_TRAIN_SAMPLE):
+    """
+    Build an index of the given factory type from a float32 (n, dim) matrix.
+    Index types that need training are trained on at most train_sample random
+    vectors. If there are too few vectors to train it (e.g. fewer than the number
+    of IVF lists), an exact flat index is built instead.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_sample:
+            rows = np.random.default_rng(0).choice(len(vectors), train_sample, replace=False)
+            sample = vectors[np.sort(rows)]
+        _disable_polysemous_training(index)
+        try:
+            index.train(sample)
+        except RuntimeError as e:
+            logger.warning(
+                "Could not train a %s index, using an exact flat index: %s", factory, e
+            )
+            index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return set_search_params(make_reconstructable(index))
+
+
+def recall_report(index, vectors, k=10, n_queries=200):
+    """
+    Compare an index with exact search over the same vectors.
+    Queries are a random sample of the indexed vectors. Returns recall@k (the share
+    of the exact top-k found by the index) and the mean latency per query of both.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rows = np.random.default_rng(1).choice(
+        len(vectors), min(n_queries, len(vectors)), replace=False
+    )
+    queries = vectors[rows]
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    start = time.perf_counter()
+    _, expected = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall": hits / (k * len(queries)),
+        "index_ms": index_ms,
+        "flat_ms": exact_ms,
+    }
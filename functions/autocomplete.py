@@ -0,0 +1,204 @@
+import re
+import heapq
+import threading
+from collections import Counter, defaultdict
+from functions.product_details import product_categories, product_images
+
+# Question templates used when the typed text is just (part of) a product name.
+QUESTION_TEMPLATES = [
+    "What is {term} used for?",
+    "What are the benefits of {term}?",
+    "How should I take {term}?",
+]
+
+# Relative weights of the suggestion sources.
+PRODUCT_WEIGHT = 100.0
+CATEGORY_WEIGHT = 50.0
+KB_TERM_WEIGHT = 1.0
+
+# Capitalized phrases of up to three words, e.g. "Vitamin C" or "Liposomal Glutathione".
+_PHRASE_PATTERN = re.compile(r"\b[A-Z][\w\-®]+(?:[ ][A-Z0-9][\w\-®]*){0,2}")
+# Words that start capitalized phrases in running text or headings but are not terms.
+_PHRASE_STOPWORDS = {
+    "a", "add", "also", "an", "and", "available", "but", "description", "each",
+    "enjoy", "even", "for", "helps", "however", "ingredients", "it", "just",
+    "method", "product", "studies", "the", "these", "they", "this", "when", "with",
+}
+# PDF extraction often glues words together ("MixMagnesium"); skip those.
+_GLUED_PATTERN = re.compile(r"[a-z][A-Z][a-z]")
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        # Best (score, term) pairs in this subtree, highest first.
+        self.top = []
+
+
+class AutocompleteIndex:
+    """
+    In-memory suggestion engine over product names, categories and phrases from the
+    knowledge base. Prefix lookups walk a trie whose nodes keep their top-k terms,
+    and typos fall back to a character-trigram index, so a lookup never scans all terms.
+    """
+
+    def __init__(self, weighted_terms, top_k=5):
+        self.top_k = top_k
+        self.terms = {}
+        for term, weight in weighted_terms:
+            key = normalize(term)
+            if key and weight > self.terms.get(key, ("", 0))[1]:
+                self.terms[key] = (term, weight)
+
+        self.root = _TrieNode()
+        self.trigram_index = defaultdict(set)
+        for key, (term, weight) in self.terms.items():
+            # Index the term from each word start so "syn c" and "c" both reach "Synergy C".
+            words = key.split(" ")
+            for i in range(len(words)):
+                self._insert(" ".join(words[i:]), weight - i * 0.1, term)
+            for gram in _trigrams(key):
+                self.trigram_index[gram].add(key)
+
+    def _insert(self, key, score, term):
+        node = self.root
+        self._offer(node, score, term)
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            self._offer(node, score, term)
+
+    def _offer(self, node, score, term):
+        for i, (_, existing) in enumerate(node.top):
+            if existing == term:
+                if node.top[i][0] >= score:
+                    return
+                node.top.pop(i)
+                break
+        node.top.append((score, term))
+        node.top.sort(reverse=True)
+        del node.top[self.top_k :]
+
+    def prefix_matches(self, prefix):
+        node = self.root
+        for char in normalize(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [term for _, term in node.top]
+
+    def fuzzy_matches(self, text, min_similarity=0.3):
+        """Rank terms by trigram Jaccard similarity to the text."""
+        grams = _trigrams(normalize(text))
+        overlap = Counter()
+        for gram in grams:
+            for key in self.trigram_index.get(gram, ()):
+                overlap[key] += 1
+        scored = []
+        for key, shared in overlap.items():
+            similarity = shared / (len(grams) + len(_trigrams(key)) - shared)
+            if similarity >= min_similarity:
+                term, weight = self.terms[key]
+                scored.append((similarity, weight, term))
+        return [term for _, _, term in heapq.nlargest(self.top_k, scored)]
+
+    def suggest(self, partial_query, limit=3):
+        """
+        Complete the end of the partial query with known terms. The longest
+        trailing run of words that prefixes a term wins; the text before it is
+        kept as the lead-in (e.g. "what is syn" -> "what is Synergy C").
+        """
+        words = partial_query.split()
+        if not words:
+            return []
+        terms, lead = [], ""
+        for start in range(max(0, len(words) - 4), len(words)):
+            run = " ".join(words[start:])
+            terms = self.prefix_matches(run)
+            if terms:
+                lead = " ".join(words[:start])
+                if start and not any(normalize(term).startswith(normalize(run)) for term in terms):
+                    # The run only matches inside terms ("oil" in "Krill Oil"), so the
+                    # words before it may be a misspelt start of the term ("krl oil").
+                    for fuzzy_start in range(start - 1, max(-1, len(words) - 4), -1):
+                        fuzzy = self.fuzzy_matches(" ".join(words[fuzzy_start:]))
+                        if fuzzy:
+                            terms, lead = fuzzy, " ".join(words[:fuzzy_start])
+                            break
+                break
+        if not terms:
+            start = max(0, len(words) - 3)
+            terms = self.fuzzy_matches(" ".join(words[start:]))
+            lead = " ".join(words[:start])
+        if not terms:
+            return []
+
+        if lead:
+            suggestions = [f"{lead} {term}" for term in terms]
+        else:
+            # The whole input is a term: offer complete questions about the best match.
+            suggestions = [template.format(term=terms[0]) for template in QUESTION_TEMPLATES]
+            suggestions += terms[1:]
+        return suggestions[:limit]
+
+
+def _is_term(phrase):
+    words = phrase.split(" ")
+    if words[0].lower() in _PHRASE_STOPWORDS or _GLUED_PATTERN.search(phrase):
+        return False
+    if len(words) == 1:
+        # Single capitalized words are mostly sentence starts; keep acronyms like DHA or B12.
+        return sum(c.isupper() or c.isdigit() for c in phrase) >= 2
+    return True
+
+
+def extract_kb_terms(texts, min_count=3):
+    """Frequent capitalized phrases from knowledge-base chunks, weighted by frequency."""
+    counts = Counter()
+    for text in texts:
+        counts.update(match.group(0) for match in _PHRASE_PATTERN.finditer(text))
+    return [
+        (phrase, KB_TERM_WEIGHT * count)
+        for phrase, count in counts.items()
+        if count >= min_count and len(phrase) > 2 and _is_term(phrase)
+    ]
+
+
+def build_autocomplete_index(chunk_texts=()):
+    weighted_terms = [(name, PRODUCT_WEIGHT) for name in product_images]
+    for category, products in product_categories.items():
+        weighted_terms.append((category, CATEGORY_WEIGHT))
+        weighted_terms.extend((name, PRODUCT_WEIGHT) for name in products)
+    weighted_terms.extend(extract_kb_terms(chunk_texts))
+    return AutocompleteIndex(weighted_terms)
+
+
+_index_cache = (None, None)
+_index_lock = threading.Lock()
+
+
+def get_autocomplete_index(version, load_chunk_texts):
+    """
+    Return the process-wide index, rebuilding it when the knowledge-base version changes.
+    load_chunk_texts() is only called on a rebuild.
+    """
+    global _index_cache
+    cached_version, index = _index_cache
+    if index is not None and cached_version == version:
+        return index
+    with _index_lock:
+        cached_version, index = _index_cache
+        if index is None or cached_version != version:
+            index = build_autocomplete_index(load_chunk_texts())
+            _index_cache = (version, index)
+    return index
@@ -0,0 +1,222 @@
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+from functions.pdf import parse_recipe_name
+from functions.product_details import product_categories
+from functions.recipeStore import make_recipe_key
+from functions.recipeProcessor import (
+    generate_recipe,
+    generate_recipe_image,
+    build_recipe_query,
+    build_image_description,
+    fetch_image,
+    request_recipe_pdf,
+    get_pinned_knowledge_hub,
+    blob_store,
+    get_recipe_store,
+    RECIPE_PROMPT_VERSION,
+)
+from services.constants import (
+    BATCH_OUTPUT_DIR,
+    BATCH_WORKERS,
+    BATCH_LLM_CONCURRENCY,
+    BATCH_IMAGE_CONCURRENCY,
+    BATCH_RETRIES,
+)
+
+MANIFEST_NAME = "manifest.json"
+# A batch is only resumed if these match; otherwise its saved recipes are stale.
+RESUME_KEYS = ("custom_instructions", "kb_version", "prompt_version")
+
+
+def products_for_categories(categories):
+    """Unique product names of the given categories, in catalog order."""
+    return list(
+        dict.fromkeys(
+            product for category in categories for product in product_categories[category]
+        )
+    )
+
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "recipe"
+
+
+def default_output_dir(name):
+    return os.path.join(BATCH_OUTPUT_DIR, slugify(name))
+
+
+def load_batch_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_batch_manifest(output_dir, manifest):
+    """Write the manifest atomically; it doubles as the checkpoint for resuming."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def generate_recipe_card(product, custom_instructions, pinned, limits, regenerate=False):
+    """
+    Generate (or reuse from the recipe store) the recipe, image and PDF for one
+    product, and return its manifest entry. The recipe text and image are
+    generated at the same time, each under its provider's concurrency limit.
+    pinned is the (version, knowledge hub) the whole batch is generated from.
+    Raises RuntimeError if the text or the image could not be generated.
+    """
+    kb_version = pinned[0]
+    recipe_key = make_recipe_key([product], custom_instructions, RECIPE_PROMPT_VERSION, kb_version)
+    stored = None if regenerate else get_recipe_store().get(recipe_key)
+    if stored is None:
+
+        async def text():
+            async with limits["llm"]:
+                return await generate_recipe(
+                    build_recipe_query([product], custom_instructions),
+                    products=[product],
+                    pinned=pinned,
+                )
+
+        async def image():
+            async with limits["image"]:
+                url = await generate_recipe_image(
+                    build_image_description([product], custom_instructions)
+                )
+                return await fetch_image(url) if url else None
+
+        response, image_sha = await asyncio.gather(text(), image())
+        if not response or not response.get("output"):
+            raise RuntimeError("no recipe text was generated")
+        if not image_sha:
+            raise RuntimeError("no recipe image was generated")
+        recipe_name, _ = parse_recipe_name(response["output"])
+        get_recipe_store().put(
+            recipe_key,
+            [product],
+            custom_instructions,
+            RECIPE_PROMPT_VERSION,
+            kb_version,
+            recipe_name,
+            response["output"],
+            image_sha=image_sha,
+        )
+        stored = {"name": recipe_name, "text": response["output"], "image_sha": image_sha}
+
+    # Rendered in the PDF thread pool, which bounds the CPU work.
+    pdf_sha = await asyncio.wrap_future(
+        request_recipe_pdf(recipe_key, stored["text"], stored["image_sha"])
+    )
+    return {
+        "status": "done",
+        "recipe_key": recipe_key,
+        "name": stored["name"],
+        "image_sha": stored["image_sha"],
+        "pdf_sha": pdf_sha,
+    }
+
+
+def export_card(output_dir, product, entry):
+    """Copy the PDF of a finished card into the run's output folder."""
+    pdf_dir = os.path.join(output_dir, "pdfs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    pdf_path = os.path.join(pdf_dir, f"{slugify(product)}.pdf")
+    shutil.copyfile(blob_store.path(entry["pdf_sha"]), pdf_path)
+    entry["pdf_path"] = pdf_path
+    return entry
+
+
+async def run_batch(
+    products,
+    output_dir,
+    custom_instructions="",
+    workers=BATCH_WORKERS,
+    llm_concurrency=BATCH_LLM_CONCURRENCY,
+    image_concurrency=BATCH_IMAGE_CONCURRENCY,
+    retries=BATCH_RETRIES,
+    regenerate=False,
+    progress=None,
+):
+    """
+    Generate a recipe card (text, image and PDF) for every product with a pool of
+    `workers` async workers. LLM and image requests are additionally limited to
+    llm_concurrency and image_concurrency at a time. Each product is retried up
+    to `retries` times with backoff.
+
+    Progress is checkpointed to output_dir/manifest.json after every product, so
+    running the same batch again resumes it: finished products are skipped and
+    failed ones are retried. Finished PDFs are copied to output_dir/pdfs/.
+    progress(finished, total, product, entry) is called after every product.
+    Returns the summary manifest.
+    """
+    # Pin the live index once, so every card is generated from the version it is
+    # keyed on; this also fails fast if there is no knowledge base.
+    pinned = await asyncio.to_thread(get_pinned_knowledge_hub)
+    kb_version = pinned[0]
+    previous = load_batch_manifest(output_dir) or {}
+    manifest = {
+        "products": products,
+        "custom_instructions": custom_instructions,
+        "kb_version": kb_version,
+        "prompt_version": RECIPE_PROMPT_VERSION,
+        "started_at": time.time(),
+    }
+    items = previous.get("items", {})
+    if any(previous.get(name) != manifest[name] for name in RESUME_KEYS):
+        items = {}  # other instructions, knowledge base or prompt; start over
+    manifest["items"] = {product: items[product] for product in products if product in items}
+    pending = [
+        product
+        for product in products
+        if regenerate or manifest["items"].get(product, {}).get("status") != "done"
+    ]
+    limits = {
+        "llm": asyncio.Semaphore(llm_concurrency),
+        "image": asyncio.Semaphore(image_concurrency),
+    }
+    queue = asyncio.Queue()
+    for product in pending:
+        queue.put_nowait(product)
+    finished = len(products) - len(pending)
+
+    async def worker():
+        nonlocal finished
+        while not queue.empty():
+            product = queue.get_nowait()
+            for attempt in range(retries + 1):
+                try:
+                    entry = await generate_recipe_card(
+                        product, custom_instructions, pinned, limits, regenerate
+                    )
+                    entry = await asyncio.to_thread(export_card, output_dir, product, entry)
+                    break
+                except Exception as e:
+                    entry = {"status": "failed", "error": str(e), "attempts": attempt + 1}
+                    if attempt < retries:
+                        await asyncio.sleep(2**attempt)
+            manifest["items"][product] = entry
+            finished += 1
+            save_batch_manifest(output_dir, manifest)
+            if progress:
+                progress(finished, len(products), product, entry)
+
+    save_batch_manifest(output_dir, manifest)
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(pending))))))
+
+    statuses = [entry.get("status") for entry in manifest["items"].values()]
+    manifest["finished_at"] = time.time()
+    manifest["duration_seconds"] = round(manifest["finished_at"] - manifest["started_at"], 1)
+    manifest["done"] = statuses.count("done")
+    manifest["failed"] = statuses.count("failed")
+    save_batch_manifest(output_dir, manifest)
+    return manifest
@@ -0,0 +1,42 @@
+import os
+import hashlib
+import threading
+
+
+class BlobStore:
+    """
+    Content-addressed files: each blob is stored once, as root/<sha[:2]>/<sha>,
+    where sha is the SHA-256 of its bytes. Blobs are never modified, so their
+    paths can be handed out and read without locking.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, sha):
+        return os.path.join(self.root, sha[:2], sha)
+
+    def put(self, data):
+        """Store bytes under their SHA-256 and return it."""
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return sha
+
+    def get(self, sha):
+        """Return the bytes of a blob, or None if it does not exist."""
+        if not sha:
+            return None
+        try:
+            with open(self.path(sha), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, sha):
+        return bool(sha) and os.path.exists(self.path(sha))
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import threading
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from services.utils import get_azure_llm, get_async_azure_llm
+from services.constants import RAG_MODE, RAG_TOP_K
+
+logger = logging.getLogger(__name__)
+
+# prompt name -> (knowledge hub the executor is bound to, AgentExecutor)
+_executor_cache = {}
+_executor_lock = threading.Lock()
+# prompt name -> prompt used by the direct RAG path
+_direct_prompt_cache = {}
+
+
+def build_agent_executor(system_prompt_text, knowledge_hub):
+    """
+    Build the retriever tool, prompt, tool-calling agent and executor for one prompt type.
+    """
+    # The agent machinery is only imported when the agent path is actually used.
+    from langchain.tools.retriever import create_retriever_tool
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+
+    retriever = knowledge_hub.as_retriever()
+    tool = create_retriever_tool(
+        retriever,
+        "pdf_extractor",
+        "Tool to answer queries from the Canprev knowledge base PDFs.",
+    )
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system_prompt_text),
+            ("placeholder", "{chat_history}"),
+            ("human", "{input}"),
+            ("placeholder", "{agent_scratchpad}"),
+        ]
+    )
+    agent = create_tool_calling_agent(get_azure_llm(), [tool], prompt)
+    return AgentExecutor(agent=agent, tools=[tool], verbose=True)
+
+
+def get_agent_executor(name, system_prompt_text, knowledge_hub):
+    """
+    Return the shared executor for a prompt type. Executors hold no per-request
+    state, so one instance serves every session; it is rebuilt only when a new
+    knowledge hub has been swapped in.
+    """
+    cached = _executor_cache.get(name)
+    if cached is not None and cached[0] is knowledge_hub:
+        return cached[1]
+    with _executor_lock:
+        cached = _executor_cache.get(name)
+        if cached is None or cached[0] is not knowledge_hub:
+            cached = (knowledge_hub, build_agent_executor(system_prompt_text, knowledge_hub))
+            _executor_cache[name] = cached
+    return cached[1]
+
+
+class _AgentFallback:
+    """
+    Context manager around the direct RAG path. A failure is logged and
+    suppressed, so the caller goes on to the agent, unless part of the answer
+    has already been streamed (the caller sets `streamed`); then it propagates.
+    """
+
+    def __init__(self):
+        self.streamed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None or self.streamed or not issubclass(exc_type, Exception):
+            return False
+        logger.warning("Direct RAG failed, falling back to the agent: %s", exc)
+        return True
+
+
+def _search_candidates(index, vector, candidates, k):
+    """
+    Return the index positions of the k candidates nearest to the query vector.
+    The candidates are scored from their stored vectors, which every index type
+    can return (IVF indexes get a direct map when built or loaded, see
+    make_reconstructable); a graph index such as HNSW cannot be searched reliably
+    through a small allowed set.
+    """
+    vectors = index.reconstruct_batch(candidates)
+    distances = ((vectors - vector) ** 2).sum(axis=1)
+    return candidates[np.argsort(distances)[:k]]
+
+
+def search_documents(knowledge_hub, question, k=RAG_TOP_K, candidates=None):
+    """
+    Return the k chunks most similar to the question. If candidates (an array of
+    index positions) is given, only those chunks are considered.
+    """
+    if candidates is None or not len(candidates):
+        return knowledge_hub.similarity_search(question, k=k)
+    vector = np.asarray([knowledge_hub.embeddings.embed_query(question)], dtype=np.float32)
+    return [
+        knowledge_hub.docstore.search(knowledge_hub.index_to_docstore_id[int(position)])
+        for position in _search_candidates(knowledge_hub.index, vector, candidates, k)
+    ]
+
+
+async def asearch_documents(knowledge_hub, question, k=RAG_TOP_K, candidates=None):
+    if candidates is None or not len(candidates):
+        return await knowledge_hub.asimilarity_search(question, k=k)
+    return await asyncio.to_thread(search_documents, knowledge_hub, question, k, candidates)
+
+
+def format_context(documents):
+    """Inline retrieved chunks into the prompt, labelled with their source PDF and page."""
+    return "\n\n".join(
+        f"[{doc.metadata.get('source', '')}, page {doc.metadata.get('page', 0) + 1}]\n"
+        f"{doc.page_content}"
+        for doc in documents
+    )
+
+
+def get_direct_chain(name, system_prompt_text, llm):
+    """
+    Return the single-call chain for a prompt type: the retrieved context is part
+    of the system message, so the LLM answers in one round trip. The prompt is
+    built once per type; composing it with the given LLM client is cheap.
+    """
+    prompt = _direct_prompt_cache.get(name)
+    if prompt is None:
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    system_prompt_text
+                    + "\n\nContext from the Canprev knowledge base:\n{context}",
+                ),
+                ("human", "{input}"),
+            ]
+        )
+        _direct_prompt_cache[name] = prompt
+    return prompt | llm | StrOutputParser()
+
+
+def run_direct_rag(
+    name, system_prompt_text, knowledge_hub, question, k=RAG_TOP_K, candidates=None,
+    context=None,
+):
+    """
+    Retrieve the top-k chunks for the question (only among the candidate
+    positions, if given) and answer with a single LLM call. A precomputed
+    context is used as is, without retrieval.
+    Returns a dict shaped like the AgentExecutor response ({"input", "output"}).
+    """
+    if context is None:
+        context = format_context(search_documents(knowledge_hub, question, k, candidates))
+    output = get_direct_chain(name, system_prompt_text, get_azure_llm()).invoke(
+        {"input": question, "context": context}
+    )
+    return {"input": question, "output": output}
+
+
+def answer_question(
+    name, system_prompt_text, knowledge_hub, question, mode=RAG_MODE, candidates=None,
+    context=None,
+):
+    """
+    Answer with the direct RAG path ("direct") or the tool-calling agent ("agent").
+    The agent is also used as a fallback if the direct path fails. candidates
+    restricts the direct path's retrieval and context replaces it; the agent
+    always searches all chunks.
+    """
+    if mode == "direct":
+        with _AgentFallback():
+            return run_direct_rag(
+                name, system_prompt_text, knowledge_hub, question,
+                candidates=candidates, context=context,
+            )
+    agent_executor = get_agent_executor(name, system_prompt_text, knowledge_hub)
+    return agent_executor.invoke({"input": question})
+
+
+async def arun_direct_rag(
+    name, system_prompt_text, knowledge_hub, question, k=RAG_TOP_K, candidates=None,
+    context=None,
+):
+    """Async run_direct_rag: the LLM call goes through the async Azure OpenAI client."""
+    if context is None:
+        documents = await asearch_documents(knowledge_hub, question, k, candidates)
+        context = format_context(documents)
+    output = await get_direct_chain(
+        name, system_prompt_text, get_async_azure_llm()
+    ).ainvoke(
+        {"input": question, "context": context}
+    )
+    return {"input": question, "output": output}
+
+
+async def aanswer_question(
+    name, system_prompt_text, knowledge_hub, question, mode=RAG_MODE, candidates=None,
+    context=None,
+):
+    """Async answer_question, so other coroutines (e.g. image generation) run meanwhile."""
+    if mode == "direct":
+        with _AgentFallback():
+            return await arun_direct_rag(
+                name, system_prompt_text, knowledge_hub, question,
+                candidates=candidates, context=context,
+            )
+    agent_executor = get_agent_executor(name, system_prompt_text, knowledge_hub)
+    return await agent_executor.ainvoke({"input": question})
+
+
+async def astream_answer(
+    name, system_prompt_text, knowledge_hub, question, mode=RAG_MODE, candidates=None,
+    context=None,
+):
+    """
+    Yield answer text chunks as the LLM generates them. The direct path streams
+    the single completion; the agent path forwards the model tokens of its final
+    answer via astream_events. Falls back to the agent if the direct path fails
+    before producing any output. A precomputed context replaces retrieval.
+    """
+    if mode == "direct":
+        with _AgentFallback() as fallback:
+            if context is None:
+                documents = await asearch_documents(
+                    knowledge_hub, question, RAG_TOP_K, candidates
+                )
+                context = format_context(documents)
+            chain = get_direct_chain(name, system_prompt_text, get_async_azure_llm())
+            async for chunk in chain.astream({"input": question, "context": context}):
+                fallback.streamed = True
+                yield chunk
+            return
+    agent_executor = get_agent_executor(name, system_prompt_text, knowledge_hub)
+    async for event in agent_executor.astream_events({"input": question}, version="v2"):
+        if event["event"] == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            if content:
+                yield content
+
+
+def stream_answer(
+    name, system_prompt_text, knowledge_hub, question, mode=RAG_MODE, candidates=None,
+    context=None,
+):
+    """
+    Synchronous astream_answer for st.write_stream. The agent fallback does not
+    stream and yields its whole answer at once.
+    """
+    if mode == "direct":
+        with _AgentFallback() as fallback:
+            if context is None:
+                documents = search_documents(knowledge_hub, question, RAG_TOP_K, candidates)
+                context = format_context(documents)
+            chain = get_direct_chain(name, system_prompt_text, get_azure_llm())
+            for chunk in chain.stream({"input": question, "context": context}):
+                fallback.streamed = True
+                yield chunk
+            return
+    agent_executor = get_agent_executor(name, system_prompt_text, knowledge_hub)
+    yield agent_executor.invoke({"input": question})["output"]
@@ -0,0 +1,124 @@
+import os
+import json
+import sqlite3
+import threading
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from functions.annIndex import make_reconstructable, set_search_params
+
+# On-disk layout of one index version:
+#   index.faiss    the FAISS index, written with faiss.write_index
+#   chunks.sqlite  chunk id, position in the index, text and metadata per chunk
+# Neither file is pickled. Readers memory-map the index and look chunks up in SQLite
+# only for the search results, so worker processes share the pages through the OS
+# page cache instead of each holding every chunk in memory.
+INDEX_FILE = "index.faiss"
+CHUNK_STORE_FILE = "chunks.sqlite"
+INDEX_FORMAT = "faiss+sqlite"
+
+# Newer FAISS releases can map flat indexes without copying them (IO_FLAG_MMAP_IFC);
+# older ones only map IVF inverted lists and read flat vectors into memory.
+_MMAP_FLAGS = (
+    faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+)
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Read-only docstore backed by chunks.sqlite. Chunks are fetched when a search
+    returns them, and each thread uses its own read-only connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Published versions never change, so SQLite can skip file locking.
+            connection = sqlite3.connect(
+                f"file:{os.path.abspath(self.path)}?mode=ro&immutable=1", uri=True
+            )
+            self._local.connection = connection
+        return connection
+
+    def search(self, search):
+        row = self._connection().execute(
+            "SELECT text, metadata FROM chunks WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def index_to_docstore_id(self):
+        rows = self._connection().execute("SELECT position, id FROM chunks")
+        return dict(rows)
+
+    def texts(self):
+        """Yield every chunk text, in index order."""
+        for (text,) in self._connection().execute("SELECT text FROM chunks ORDER BY position"):
+            yield text
+
+    def documents(self):
+        """Return {id: Document} for every chunk."""
+        return {
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+            for chunk_id, text, metadata in self._connection().execute(
+                "SELECT id, text, metadata FROM chunks"
+            )
+        }
+
+
+def _chunk_rows(knowledge_hub):
+    for position, chunk_id in knowledge_hub.index_to_docstore_id.items():
+        document = knowledge_hub.docstore.search(chunk_id)
+        yield chunk_id, position, document.page_content, json.dumps(document.metadata)
+
+
+def save_chunk_store(path, knowledge_hub):
+    """Write every chunk of the knowledge hub, with its index position, to SQLite."""
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute(
+            "CREATE TABLE chunks ("
+            "id TEXT PRIMARY KEY, position INTEGER UNIQUE, text TEXT, metadata TEXT)"
+        )
+        connection.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", _chunk_rows(knowledge_hub))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def save_knowledge_hub(knowledge_hub, folder):
+    """Write the FAISS index and the chunk store of a knowledge hub to a folder."""
+    os.makedirs(folder, exist_ok=True)
+    faiss.write_index(knowledge_hub.index, os.path.join(folder, INDEX_FILE))
+    save_chunk_store(os.path.join(folder, CHUNK_STORE_FILE), knowledge_hub)
+
+
+def load_knowledge_hub(folder, embeddings, writable=False):
+    """
+    Load a knowledge hub saved with save_knowledge_hub.
+    By default the index is memory-mapped read-only and chunks are read from SQLite
+    on demand, which is what the apps need for searching. writable=True reads the
+    index and all chunks into memory, so chunks can be added and deleted.
+    """
+    index_path = os.path.join(folder, INDEX_FILE)
+    store_path = os.path.join(folder, CHUNK_STORE_FILE)
+    if not os.path.exists(store_path):
+        raise FileNotFoundError(
+            f"No {CHUNK_STORE_FILE} in {folder}; rebuild the knowledge base."
+        )
+    docstore = SQLiteDocstore(store_path)
+    index_to_docstore_id = docstore.index_to_docstore_id()
+    if writable:
+        index = faiss.read_index(index_path)
+        docstore = InMemoryDocstore(docstore.documents())
+    else:
+        index = faiss.read_index(index_path, _MMAP_FLAGS)
+    set_search_params(make_reconstructable(index))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
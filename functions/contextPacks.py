@@ -0,0 +1,207 @@
+import os
+import re
+import json
+from functools import lru_cache
+from functions.product_details import product_images
+from functions.productMentions import normalize_text, get_product_matcher
+from functions.embeddingExecutor import estimate_tokens
+from services.constants import CONTEXT_PACK_MAX_TOKENS, CHUNK_OVERLAP
+
+PACKS_FILE = "context_packs.json"
+# Chunks of a page overlap by whole words; shorter matches are not overlap.
+MIN_OVERLAP = 10
+
+# Product sections in the description PDFs look like
+#   Product Name: <name>
+#   Description: <text> ... For the following health goals:<goals>
+SECTION_HEADER = re.compile(r"Product Name:\s*(.+)")
+HEALTH_GOALS = re.compile(r"For the following health goals:\s*(.*)", re.DOTALL)
+# PDF text often drops the space after a full stop ("Absolutely.5-HTP").
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|(?<=[a-z][.!?])(?=[A-Z0-9])")
+# ...and between run-together list items ("Hormonal BalanceMood & Cognitive").
+RUN_TOGETHER = re.compile(r"(?<=[a-z])(?=[A-Z])")
+# Sentences with amounts, forms or ingredients are the most useful for a recipe.
+DOSING_TERMS = re.compile(
+    r"\d\s*(mg|mcg|µg|iu|g|ml|billion|cfu)\b|\b(capsules?|tablets?|softgels?|scoops?|"
+    r"servings?|tbsp|tsp|cups?|dose|daily|take|ingredients?|formula|extract|derived|"
+    r"contains|blend|flavou?r|powder|liquid|liposomal)\b",
+    re.IGNORECASE,
+)
+
+
+def _chunk_order(document, chunk_id):
+    # Chunk IDs end in "<page>-<index within the page>" (see iter_chunks_with_ids).
+    position = chunk_id.rsplit("#", 1)[-1]
+    index = position.rsplit("-", 1)[-1]
+    return document.metadata.get("page", 0), int(index) if index.isdigit() else 0
+
+
+def _join_chunks(chunks, max_overlap=CHUNK_OVERLAP, min_overlap=MIN_OVERLAP):
+    """
+    Join the (page, text) chunks of a document in order, dropping the text that
+    consecutive chunks of the same page overlap by. Shorter matches, and any
+    across pages, are coincidences such as a repeated letter, not overlap.
+    """
+    joined, previous_page = "", None
+    for page, text in chunks:
+        overlap = 0
+        if page == previous_page:
+            limit = min(len(joined), len(text), max_overlap)
+            overlap = next(
+                (k for k in range(limit, min_overlap - 1, -1) if joined.endswith(text[:k])), 0
+            )
+        joined = joined + text[overlap:] if overlap else f"{joined}\n{text}" if joined else text
+        previous_page = page
+    return joined
+
+
+def source_texts(knowledge_hub):
+    """Rebuild the full text of every source PDF from its chunks, in page order."""
+    chunks = {}
+    for chunk_id in knowledge_hub.index_to_docstore_id.values():
+        document = knowledge_hub.docstore.search(chunk_id)
+        source = document.metadata.get("source", "")
+        chunks.setdefault(source, []).append(
+            (_chunk_order(document, chunk_id), document.page_content)
+        )
+    return {
+        source: _join_chunks((page, text) for (page, _), text in sorted(items))
+        for source, items in chunks.items()
+    }
+
+
+def split_sentences(text):
+    """Split running text into sentences; line breaks are treated as spaces."""
+    return [sentence for sentence in SENTENCE_BREAK.split(" ".join(text.split())) if sentence]
+
+
+def split_lines(text):
+    """Split text such as ingredient lists into lines, then each line into sentences."""
+    return [
+        sentence
+        for line in text.splitlines()
+        for sentence in split_sentences(line.lstrip("•·*- \t"))
+    ]
+
+
+def _product_for_header(header, names_by_key):
+    name = names_by_key.get(normalize_text(header))
+    if name is None:
+        # e.g. a header with a trailing size; the longest contained name is the product.
+        found = get_product_matcher().find(header)
+        name = max(found, key=len) if found else None
+    return name
+
+
+def product_sections(text, names_by_key):
+    """Yield (product name, description, health goals) for each product section."""
+    headers = list(SECTION_HEADER.finditer(text))
+    for header, following in zip(headers, headers[1:] + [None]):
+        name = _product_for_header(header.group(1), names_by_key)
+        if name is None:
+            continue
+        body = text[header.end():following.start() if following else len(text)]
+        body = " ".join(body.split()).split("Description:", 1)[-1]
+        goals = ""
+        match = HEALTH_GOALS.search(body)
+        if match:
+            body, goals = body[:match.start()], RUN_TOGETHER.sub(", ", match.group(1).strip())
+        yield name, body, goals
+
+
+def _fit(sentences, max_tokens):
+    """
+    Choose sentences within the token budget: the opening sentence, then the ones
+    about amounts, forms and ingredients, then the rest. They keep their order.
+    """
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (i != 0, not DOSING_TERMS.search(sentences[i]), i),
+    )
+    chosen, used = set(), 0
+    for i in ranked:
+        tokens = estimate_tokens(sentences[i])
+        if used + tokens <= max_tokens:
+            chosen.add(i)
+            used += tokens
+    return [sentences[i] for i in sorted(chosen)], used
+
+
+def build_context_packs(knowledge_hub, max_tokens=CONTEXT_PACK_MAX_TOKENS):
+    """
+    Build {product name: context pack} from the knowledge hub. A pack is the
+    product's description (from its "Product Name:" section), its health goals and
+    the lines of other documents that mention it, such as recipe ingredients with
+    amounts. Sentences are deduplicated and trimmed to about max_tokens per
+    product, keeping the ones with amounts, forms and ingredients first.
+    Products that no document describes or mentions get no pack.
+    """
+    names_by_key = {normalize_text(name): name for name in product_images}
+    matcher = get_product_matcher()
+    descriptions, goals, mentions = {}, {}, {}
+    for source, text in source_texts(knowledge_hub).items():
+        title = os.path.splitext(os.path.basename(source))[0].strip()
+        in_sections = False
+        for name, body, product_goals in product_sections(text, names_by_key):
+            in_sections = True
+            descriptions.setdefault(name, []).extend(split_sentences(body))
+            if product_goals:
+                goals.setdefault(name, product_goals)
+        if in_sections:
+            continue
+        for line in split_lines(text):
+            for name in matcher.find(line):
+                if normalize_text(line) == normalize_text(name):
+                    continue  # a bare name, e.g. in a product list
+                mentions.setdefault(name, []).append(f"{line} ({title})")
+
+    packs = {}
+    for name in product_images:
+        seen, description, usage = set(), [], []
+        for sentences, target in ((descriptions.get(name, []), description),
+                                  (mentions.get(name, []), usage)):
+            for sentence in sentences:
+                key = normalize_text(sentence)
+                if key not in seen:
+                    seen.add(key)
+                    target.append(sentence)
+        if not (description or usage):
+            continue
+        header = f"Product: {name}"
+        budget = max_tokens - estimate_tokens(header)
+        if name in goals:
+            budget -= estimate_tokens(goals[name])
+        # Up to a third of the budget goes to how recipes use the product.
+        usage, used = _fit(usage, budget // 3)
+        description, _ = _fit(description, budget - used)
+        lines = [header]
+        if description:
+            lines.append(" ".join(description))
+        if name in goals and budget > 0:
+            lines.append(f"Health goals: {goals[name]}")
+        lines.extend(f"- {line}" for line in usage)
+        packs[name] = "\n".join(lines)
+    return packs
+
+
+def save_context_packs(folder, packs):
+    with open(os.path.join(folder, PACKS_FILE), "w", encoding="utf-8") as f:
+        json.dump(packs, f)
+
+
+@lru_cache(maxsize=4)
+def load_context_packs(folder):
+    """
+    Return {product name: context pack} saved with an index version, or None if
+    the version has none. Index versions never change, so results are cached by folder.
+    """
+    path = os.path.join(folder, PACKS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_packs(packs, products):
+    """Join the packs of the products, which must all have one, into a prompt context."""
+    return "\n\n".join(packs[product] for product in products)
@@ -0,0 +1,195 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from services.constants import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+
+INDEX_FILE = "index.sqlite"
+VECTORS_FILE = "vectors.f32"
+INITIAL_CAPACITY = 1024
+
+
+def normalize_text(text):
+    """Collapse whitespace so re-chunking that only moves line breaks still hits the cache."""
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings object with an on-disk cache keyed by
+    (model id, hash of the normalized chunk text).
+
+    Vectors are stored in a float32 memmap and looked up through a SQLite index
+    of key -> (slot, last use). When the cache is full the least recently used
+    slots are overwritten. The cache can be shared by several processes (both
+    apps and build_index.py): lookups and inserts run in a SQLite write
+    transaction, so only one process at a time allocates slots or reads and
+    writes vectors. Only embed_documents is cached; queries are passed straight
+    to the wrapped model.
+    """
+
+    def __init__(self, embeddings, model_id, cache_dir=EMBEDDING_CACHE_DIR,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._vectors = None
+        self._dim = None
+        self._capacity = 0
+
+    # ---- storage -------------------------------------------------------
+
+    def _connection(self):
+        # Opened on first use, so importing the apps does not create the cache.
+        if self._db is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            db = sqlite3.connect(
+                os.path.join(self.cache_dir, INDEX_FILE),
+                timeout=60,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used INTEGER)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self._db = db
+        return self._db
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Hold the cache's write lock, shared by all processes, and map the vectors
+        file at the size other processes may have grown it to.
+        """
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            meta = dict(db.execute("SELECT name, value FROM meta"))
+            if meta.get("model_id") != self.model_id:
+                # Vectors from another model are useless; start over.
+                db.execute("DELETE FROM entries")
+                db.execute("DELETE FROM meta")
+                db.execute("INSERT INTO meta VALUES ('model_id', ?)", (self.model_id,))
+                meta = {}
+            self._map(meta.get("dim"), meta.get("capacity", 0))
+            yield db
+            if self._vectors is not None:
+                self._vectors.flush()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _map(self, dim, capacity):
+        if (dim, capacity) == (self._dim, self._capacity):
+            return
+        self._vectors = None
+        self._dim, self._capacity = dim, capacity
+        if capacity:
+            self._vectors = np.memmap(
+                os.path.join(self.cache_dir, VECTORS_FILE),
+                dtype=np.float32,
+                mode="r+",
+                shape=(capacity, dim),
+            )
+
+    def _grow(self, db, dim, needed):
+        """Extend the vectors file so it can hold at least `needed` vectors."""
+        capacity = max(self._capacity, INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        capacity = min(capacity, self.max_entries)
+        if capacity == self._capacity:
+            return
+        with open(os.path.join(self.cache_dir, VECTORS_FILE), "ab") as f:
+            f.truncate(capacity * dim * 4)
+        db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            [("dim", dim), ("capacity", capacity)],
+        )
+        self._map(dim, capacity)
+
+    def _size(self, db):
+        # Used slots are always 0..len-1, see _free_slots.
+        return db.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM entries").fetchone()[0]
+
+    def _free_slots(self, db, count):
+        """
+        Return `count` unused slots, evicting the least recently used entries if
+        the cache is full. Evicted slots are reused straight away, so used slots
+        are always 0..len-1.
+        """
+        size = self._size(db)
+        slots = list(range(size, min(size + count, self._capacity)))
+        if len(slots) < count:
+            evicted = db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                (count - len(slots),),
+            ).fetchall()
+            db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+            slots += [slot for _, slot in evicted]
+        return slots
+
+    # ---- Embeddings interface -----------------------------------------
+
+    def _key(self, text):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_id}:{digest}"
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        results = [None] * len(texts)
+        missing = []
+        with self._lock, self._transaction() as db:
+            now = time.time_ns()
+            for i, key in enumerate(keys):
+                row = db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    missing.append(i)
+                    continue
+                results[i] = self._vectors[row[0]].tolist()
+                db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if not missing:
+            return results
+
+        # Embed each distinct missing text once.
+        unique = {}
+        for i in missing:
+            unique.setdefault(keys[i], texts[i])
+        vectors = self.embeddings.embed_documents(list(unique.values()))
+        by_key = dict(zip(unique, vectors))
+        for i in missing:
+            results[i] = by_key[keys[i]]
+
+        with self._lock, self._transaction() as db:
+            # Another process may have cached some of them meanwhile.
+            new = [
+                (key, vector)
+                for key, vector in by_key.items()
+                if db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is None
+            ][-self.max_entries:]
+            if new:
+                self._grow(db, self._dim or len(new[0][1]), self._size(db) + len(new))
+                now = time.time_ns()
+                for (key, vector), slot in zip(new, self._free_slots(db, len(new))):
+                    self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+                    db.execute("INSERT INTO entries VALUES (?, ?, ?)", (key, slot, now))
+        return results
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,154 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from services.constants import (
+    EMBED_MAX_CONCURRENCY,
+    EMBED_REQUEST_MAX_INPUTS,
+    EMBED_REQUEST_MAX_TOKENS,
+    EMBED_TOKENS_PER_MINUTE,
+)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for batching and rate limiting."""
+    return len(text) // 4 + 1
+
+
+class AdaptiveTokenBucket:
+    """
+    Thread-safe token bucket limiting embedding tokens per second.
+    The refill rate is halved on every rate-limit response and slowly raised
+    back towards the configured maximum after successful requests (AIMD).
+    """
+
+    def __init__(self, tokens_per_minute, capacity=None, min_fraction=0.05):
+        self.max_rate = tokens_per_minute / 60.0
+        self.min_rate = self.max_rate * min_fraction
+        self.rate = self.max_rate
+        self.capacity = capacity or tokens_per_minute / 6.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens):
+        """Block until `tokens` tokens are available, then take them."""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_rate_limited(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0
+
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header on an openai/httpx error, if present."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_rate_limited(exc):
+    return getattr(exc, "status_code", None) == 429 or (
+        getattr(getattr(exc, "response", None), "status_code", None) == 429
+    )
+
+
+class ConcurrentEmbeddings(Embeddings):
+    """
+    Wraps an embeddings object so embed_documents groups texts into the largest
+    batches the provider accepts and sends up to `max_concurrency` requests at once.
+    Requests are paced by an AdaptiveTokenBucket and retried with exponential
+    backoff (honouring Retry-After) when the provider answers 429.
+
+    The wrapped client should have its own retries disabled (e.g.
+    OpenAIEmbeddings(max_retries=0)) so rate limits reach this scheduler.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        max_concurrency=EMBED_MAX_CONCURRENCY,
+        max_batch_inputs=EMBED_REQUEST_MAX_INPUTS,
+        max_batch_tokens=EMBED_REQUEST_MAX_TOKENS,
+        tokens_per_minute=EMBED_TOKENS_PER_MINUTE,
+        max_retries=6,
+        base_delay=1.0,
+    ):
+        self.embeddings = embeddings
+        self.max_concurrency = max_concurrency
+        self.max_batch_inputs = max_batch_inputs
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.limiter = AdaptiveTokenBucket(tokens_per_minute, capacity=max_batch_tokens)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def _make_batches(self, texts):
+        """Group consecutive texts into batches bounded by input count and token estimate."""
+        batches = []
+        current, current_tokens = [], 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if current and (
+                len(current) == self.max_batch_inputs
+                or current_tokens + tokens > self.max_batch_tokens
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch):
+        tokens = sum(estimate_tokens(text) for text in batch)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                vectors = self.embeddings.embed_documents(batch)
+            except Exception as exc:
+                if not _is_rate_limited(exc) or attempt == self.max_retries:
+                    raise
+                self.limiter.on_rate_limited()
+                delay = _retry_after(exc)
+                if delay is None:
+                    delay = self.base_delay * (2**attempt) * (0.5 + random.random())
+                time.sleep(delay)
+                continue
+            self.limiter.on_success()
+            return vectors
+
+    def embed_documents(self, texts):
+        batches = self._make_batches(list(texts))
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        results = []
+        for vectors in self._executor.map(self._embed_batch, batches):
+            results.extend(vectors)
+        return results
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
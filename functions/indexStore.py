@@ -0,0 +1,111 @@
+import os
+import time
+import shutil
+from services.constants import INDEX_VERSIONS_TO_KEEP
+
+# Layout of an index root folder:
+#   faiss_index/CURRENT        name of the live version, e.g. "v1718000000000000000"
+#   faiss_index/v<timestamp>/  one complete, immutable index per version
+# Writers fill a new version folder and then flip CURRENT, so readers never see a
+# partially written index and can keep using the version they loaded.
+POINTER_FILE = "CURRENT"
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_tree(path):
+    """Flush every file in a folder, and the folder itself, to disk."""
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            _fsync_path(os.path.join(dirpath, name))
+        _fsync_path(dirpath)
+
+
+def list_versions(root):
+    """Version folder names in the root, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(root)
+        if name.startswith("v") and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def current_version(root):
+    """Name of the live version, or None if nothing has been published yet."""
+    try:
+        with open(os.path.join(root, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_version_path(root):
+    """Folder of the live version, or None if nothing has been published yet."""
+    version = current_version(root)
+    return os.path.join(root, version) if version else None
+
+
+def new_version_path(root):
+    """Path for a new, not yet published version folder."""
+    os.makedirs(root, exist_ok=True)
+    return os.path.join(root, f"v{time.time_ns()}")
+
+
+def publish_version(root, version_path, keep=INDEX_VERSIONS_TO_KEEP):
+    """
+    Make a fully written version live: fsync it, atomically replace the CURRENT
+    pointer, then delete all but the newest `keep` versions.
+    """
+    fsync_tree(version_path)
+    version = os.path.basename(version_path)
+    pointer = os.path.join(root, POINTER_FILE)
+    tmp_pointer = f"{pointer}.tmp-{os.getpid()}"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+    _fsync_path(root)
+    prune_versions(root, keep)
+    return version
+
+
+def prune_versions(root, keep=INDEX_VERSIONS_TO_KEEP):
+    """Delete old versions, keeping the newest `keep` and always the live one."""
+    live = current_version(root)
+    versions = list_versions(root)
+    for version in versions[: max(0, len(versions) - keep)]:
+        if version != live:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def rollback(root, steps=1):
+    """
+    Point CURRENT back to an older kept version and return its name.
+    Raises ValueError if steps is less than 1 or there is no such version.
+    """
+    if steps < 1:
+        raise ValueError(f"Cannot roll back {steps} versions; steps must be at least 1.")
+    versions = list_versions(root)
+    live = current_version(root)
+    if live not in versions:
+        raise ValueError(f"No published index in {root}.")
+    target = versions.index(live) - steps
+    if target < 0:
+        raise ValueError(f"Only {versions.index(live)} older version(s) kept in {root}.")
+    pointer = os.path.join(root, POINTER_FILE)
+    tmp_pointer = f"{pointer}.tmp-{os.getpid()}"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(versions[target])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+    return versions[target]
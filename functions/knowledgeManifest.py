@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from services.constants import MANIFEST_FILE
+
+
+def list_pdf_files(folder):
+    """
+    Return the PDF paths in the folder, using the same glob and path format
+    as PyPDFDirectoryLoader so they match the "source" metadata of documents.
+    """
+    return sorted(str(p) for p in Path(folder).glob("**/[!.]*.pdf") if p.is_file())
+
+
+def file_sha256(path):
+    """Hash a file in 1 MB blocks so large PDFs are never read into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(index_folder):
+    """
+    Load the manifest stored next to the FAISS index.
+    Returns an empty dict if no manifest exists (e.g. an index built before manifests).
+    """
+    path = os.path.join(index_folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+
+def load_manifest_settings(index_folder):
+    """Return the build settings (e.g. chunk size) recorded in the manifest, if any."""
+    path = os.path.join(index_folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("settings", {})
+
+
+def save_manifest(index_folder, files, settings=None):
+    """Write the manifest next to the FAISS index."""
+    os.makedirs(index_folder, exist_ok=True)
+    path = os.path.join(index_folder, MANIFEST_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings or {}, "files": files}, f, indent=2)
+
+
+def scan_pdf_folder(folder, previous=None):
+    """
+    Return {path: {"sha256", "mtime", "size"}} for every PDF in the folder.
+    Files whose mtime and size match the previous manifest reuse the stored hash
+    instead of being re-read.
+    """
+    previous = previous or {}
+    current = {}
+    for path in list_pdf_files(folder):
+        stat = os.stat(path)
+        old = previous.get(path)
+        if old and old.get("mtime") == stat.st_mtime and old.get("size") == stat.st_size:
+            sha = old["sha256"]
+        else:
+            sha = file_sha256(path)
+        current[path] = {"sha256": sha, "mtime": stat.st_mtime, "size": stat.st_size}
+    return current
+
+
+def diff_manifest(previous, current):
+    """
+    Compare two manifests and return (added, changed, removed) lists of paths.
+    A file counts as changed only if its content hash differs.
+    """
+    added = [p for p in current if p not in previous]
+    removed = [p for p in previous if p not in current]
+    changed = [
+        p
+        for p in current
+        if p in previous and previous[p].get("sha256") != current[p]["sha256"]
+    ]
+    return added, changed, removed
+
+
+def make_chunk_id(source, sha256, position):
+    """Deterministic ID for the chunk at a given position in a given version of a PDF."""
+    return f"{source}#{sha256[:16]}#{position}"
@@ -1,6 +1,4 @@
-import os
 import re
-import requests
 from fpdf import FPDF
 
 
@@ -29,27 +27,14 @@ def strip_markdown(md):
     return md
 
 
-def create_pdf(recipe_name, recipe_image_url, clean_text):
+def create_pdf(recipe_name, recipe_image_path, clean_text):
     """
-    1. Downloads the recipe image.
-    2. Places a header with the recipe name (if any) at the top (left-aligned).
-    3. Left-aligns a larger image (e.g., 80 mm wide x 80 mm high).
-    4. Places the plain-text recipe below the image.
+    1. Places a header with the recipe name (if any) at the top (left-aligned).
+    2. Left-aligns a larger image (e.g., 80 mm wide x 80 mm high), read from the
+       local PNG file (the cached image blob, which has no file extension).
+    3. Places the plain-text recipe below the image.
     Returns the PDF content as bytes.
     """
-    # Download the image
-    response = requests.get(recipe_image_url)
-    if response.status_code != 200:
-        return None
-
-    # Save image to temp file
-    import tempfile
-
-    temp_img = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    temp_img.write(response.content)
-    temp_img.flush()
-    temp_img.close()
-
     # Strip markdown and ensure Latin-1 encoding
     plain_text = strip_markdown(clean_text)
     plain_text_clean = plain_text.encode("latin-1", errors="replace").decode("latin-1")
@@ -68,14 +53,14 @@ def create_pdf(recipe_name, recipe_image_url, clean_text):
     # 2) Add the image, left-aligned (x=10), bigger size (80 x 80 mm)
     image_width = 80
     image_height = 80
-    pdf.image(temp_img.name, x=10, y=pdf.get_y(), w=image_width, h=image_height)
+    pdf.image(
+        recipe_image_path, x=10, y=pdf.get_y(), w=image_width, h=image_height, type="PNG"
+    )
     pdf.set_y(pdf.get_y() + image_height + 2)  # move below the image
 
     # 3) Add the plain-text recipe
     pdf.set_font("Times", size=11)
     pdf.multi_cell(0, 8, plain_text_clean)
 
-    os.unlink(temp_img.name)
-
     pdf_bytes = pdf.output(dest="S").encode("latin1")
     return pdf_bytes
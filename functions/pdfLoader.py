@@ -0,0 +1,106 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pypdf
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders.blob_loaders import Blob
+from langchain_community.document_loaders.parsers.pdf import PyPDFParser
+from services.constants import PDF_PAGES_PER_TASK
+
+
+def _load_page_range(path, start, stop):
+    """
+    Parse pages [start, stop) of a PDF in a worker process.
+    The pages are copied into an in-memory PDF and parsed with the same parser
+    PyPDFLoader uses, then the page metadata is mapped back to the original file.
+    """
+    reader = pypdf.PdfReader(path)
+    writer = pypdf.PdfWriter()
+    for page_number in range(start, stop):
+        writer.add_page(reader.pages[page_number])
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+
+    blob = Blob.from_data(buffer.getvalue(), path=path)
+    documents = list(PyPDFParser().lazy_parse(blob))
+    for offset, doc in enumerate(documents):
+        page_number = start + offset
+        doc.metadata["source"] = path
+        doc.metadata["total_pages"] = len(reader.pages)
+        doc.metadata["page"] = page_number
+        doc.metadata["page_label"] = reader.page_labels[page_number]
+    return documents
+
+
+def _load_pdf(path):
+    """Parse a whole PDF in a worker process."""
+    documents = PyPDFLoader(path).load()
+    for doc in documents:
+        doc.metadata["source"] = path
+    return documents
+
+
+def _plan_tasks(paths, pages_per_task):
+    """
+    Split the work into one task per small PDF and one task per page range of
+    large PDFs, so a single big catalog does not end up on one core.
+    """
+    tasks = []
+    for path in paths:
+        total_pages = len(pypdf.PdfReader(path).pages)
+        if total_pages <= pages_per_task:
+            tasks.append((_load_pdf, (path,)))
+        else:
+            for start in range(0, total_pages, pages_per_task):
+                stop = min(start + pages_per_task, total_pages)
+                tasks.append((_load_page_range, (path, start, stop)))
+    # Submit the biggest tasks first so they do not finish last.
+    tasks.sort(key=lambda task: task[0] is _load_pdf)
+    return tasks
+
+
+def iter_pdf_documents(paths, max_workers=None, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Parse the given PDFs in a process pool and yield Document objects (one per page)
+    as soon as each task finishes. Documents keep the same "source" and "page"
+    metadata that PyPDFDirectoryLoader produces.
+    At most two tasks per worker are in flight, and a task's pages are released
+    once they have been yielded, so memory does not grow with the number of PDFs.
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = _plan_tasks(paths, pages_per_task)
+
+    if max_workers == 1:
+        for func, args in tasks:
+            yield from func(*args)
+        return
+
+    workers = min(max_workers, len(tasks))
+    pending_tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        while True:
+            for func, args in pending_tasks:
+                in_flight.add(executor.submit(func, *args))
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            while done:
+                yield from done.pop().result()
+
+
+def load_pdf_documents(paths, max_workers=None):
+    """
+    Parse the given PDFs in parallel and return their pages ordered by source and page,
+    matching the order of a serial load.
+    """
+    documents = list(iter_pdf_documents(paths, max_workers=max_workers))
+    documents.sort(key=lambda doc: (doc.metadata["source"], doc.metadata.get("page", 0)))
+    return documents
@@ -0,0 +1,115 @@
+import os
+import json
+import re
+from collections import deque
+from functools import lru_cache
+from functions.product_details import product_images
+
+MENTIONS_FILE = "product_mentions.json"
+
+
+def normalize_text(text):
+    """Lowercase, drop trademark signs and collapse whitespace, for name matching."""
+    return " ".join(re.sub(r"[®™]", "", text).lower().split())
+
+
+class ProductMatcher:
+    """
+    Aho-Corasick automaton over normalized product names. find() reports every
+    name that occurs in a text in one pass over it, however many names there are.
+    """
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for name_id, name in enumerate(self.names):
+            state = 0
+            for char in normalize_text(name):
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(name_id)
+
+        # Breadth-first, so a state's failure link is final before its children's.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """Return the product names mentioned in the text, in order of first mention."""
+        found = {}
+        state = 0
+        for char in normalize_text(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for name_id in self._output[state]:
+                found.setdefault(name_id, None)
+        return [self.names[name_id] for name_id in found]
+
+
+@lru_cache(maxsize=None)
+def get_product_matcher():
+    return ProductMatcher(product_images.keys())
+
+
+def tag_products(chunk):
+    """Record the product names a chunk mentions in its "products" metadata."""
+    chunk.metadata["products"] = get_product_matcher().find(chunk.page_content)
+    return chunk
+
+
+def build_product_mentions(knowledge_hub):
+    """
+    Map each chunk ID of the knowledge hub to the product names its text mentions,
+    using the tags added at ingest (or matching the text of untagged chunks).
+    """
+    matcher = get_product_matcher()
+    mentions = {}
+    for chunk_id in knowledge_hub.index_to_docstore_id.values():
+        document = knowledge_hub.docstore.search(chunk_id)
+        names = document.metadata.get("products")
+        if names is None:
+            names = matcher.find(document.page_content)
+        if names:
+            mentions[chunk_id] = names
+    return mentions
+
+
+def build_product_positions(mentions, index_to_docstore_id):
+    """Invert a mention index into {product name: index positions of its chunks}."""
+    positions = {}
+    for position, chunk_id in index_to_docstore_id.items():
+        for name in mentions.get(chunk_id, []):
+            positions.setdefault(name, []).append(position)
+    return positions
+
+
+def save_product_mentions(folder, mentions):
+    with open(os.path.join(folder, MENTIONS_FILE), "w", encoding="utf-8") as f:
+        json.dump(mentions, f)
+
+
+@lru_cache(maxsize=4)
+def load_product_mentions(folder):
+    """
+    Return {chunk ID: product names} saved with an index version, or None if the
+    version has none. Index versions never change, so results are cached by folder.
+    """
+    path = os.path.join(folder, MENTIONS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
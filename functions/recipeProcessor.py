@@ -1,105 +1,640 @@
 import os
-import time
-import openai
 import asyncio
+import logging
+import hashlib
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
 import streamlit as st
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from services.utils import azureLlm, imageClient
-from langchain_openai import OpenAIEmbeddings
+from services.utils import get_async_image_client, get_async_http_client
 from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.tools.retriever import create_retriever_tool
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from services.prompt import system_prompt
-from services.constants import DATA_FOLDER, VECTOR_DB
-from langchain.embeddings import FakeEmbeddings
+from functions.pdf import parse_recipe_name, create_pdf
+from functions.chains import (
+    aanswer_question,
+    answer_question,
+    astream_answer,
+    asearch_documents,
+    format_context,
+)
+from services.constants import (
+    DATA_FOLDER,
+    VECTOR_DB,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    EMBED_BATCH_SIZE,
+    BUILD_INDEX_ON_DEMAND,
+    RAG_MODE,
+    RAG_TOP_K,
+    INDEX_FACTORY,
+    RECIPE_PRODUCT_FILTER,
+    RECIPE_CONTEXT_PACKS,
+    RECIPE_STORE_DB,
+    RECIPE_BLOB_DIR,
+    IMAGE_FETCH_TIMEOUT,
+    IMAGE_FETCH_RETRIES,
+)
+from functions.recipeStore import RecipeStore
+from functions.blobStore import BlobStore
+from functions.embeddingCache import CachedEmbeddings
+from functions.embeddingExecutor import ConcurrentEmbeddings
+from functions.pdfLoader import iter_pdf_documents, load_pdf_documents
+from functions.knowledgeManifest import (
+    list_pdf_files,
+    load_manifest,
+    load_manifest_settings,
+    save_manifest,
+    scan_pdf_folder,
+    diff_manifest,
+    make_chunk_id,
+)
+from functions.indexStore import (
+    current_version,
+    current_version_path,
+    new_version_path,
+    publish_version,
+)
+from functions.chunkStore import INDEX_FORMAT, save_knowledge_hub, load_knowledge_hub
+from functions.annIndex import build_index, is_flat_factory, stores_exact_vectors
+from functions.productMentions import (
+    tag_products,
+    build_product_mentions,
+    build_product_positions,
+    save_product_mentions,
+    load_product_mentions,
+)
+from functions.contextPacks import (
+    build_context_packs,
+    save_context_packs,
+    load_context_packs,
+    format_packs,
+)
+from langchain_community.embeddings import FakeEmbeddings
+
+logger = logging.getLogger(__name__)
 
 # Use HuggingFaceInferenceAPIEmbeddings which works well in cloud environments
 # This doesn't require downloading models, it uses the HuggingFace Inference API
-embeddings = FakeEmbeddings(size=1536)
+# Chunk embeddings are cached on disk, so rebuilds only embed new or changed text;
+# cache misses are sent as concurrent, rate-limited batches.
+# Change model_id whenever the underlying model changes.
+embeddings = CachedEmbeddings(
+    ConcurrentEmbeddings(FakeEmbeddings(size=1536)), model_id="fake-1536"
+)
+
+# Process-wide (version, FAISS index) pair shared by all Streamlit sessions.
+# The pair is replaced as a whole and the index object is never mutated after
+# it is published, so callers holding a reference keep a consistent snapshot.
+_knowledge_hub_cache = (None, None)
+_knowledge_hub_lock = threading.RLock()
+# (index version, {product name: index positions of the chunks mentioning it})
+_product_positions_cache = (None, {})
 
-api_key = st.secrets.get("OPENAI_API_KEY")
+# Generated images and PDFs are kept once, by content hash, in the blob store.
+# Generated recipes are keyed by make_recipe_key and reused until the recipe prompt
+# or the knowledge base changes; they reference their image and PDF blobs.
+blob_store = BlobStore(RECIPE_BLOB_DIR)
 
 
-def get_pdf_texts():
+@lru_cache(maxsize=None)
+def get_recipe_store():
+    """
+    The recipe store, persisted in RECIPE_STORE_DB. It is opened on first use,
+    so importing this module does not create the database.
+    """
+    return RecipeStore(RECIPE_STORE_DB, blob_store)
+
+
+# PDFs are rendered in the background, at most once per recipe key, text and
+# image at a time.
+_pdf_executor = ThreadPoolExecutor(max_workers=2)
+_pdf_jobs = {}
+_pdf_jobs_lock = threading.Lock()
+RECIPE_PROMPT_VERSION = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def get_pdf_texts(max_workers=None):
     """
     Load all PDFs from the "docs" folder.
+    PDFs (and page ranges of large PDFs) are parsed in parallel worker processes.
+    """
+    return load_pdf_documents(list_pdf_files(DATA_FOLDER), max_workers=max_workers)
+
+
+def iter_chunks_with_ids(documents, manifest, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Split the documents one page at a time and yield (chunk, chunk_id) pairs.
+    Chunk IDs are derived from the source PDF's content hash and the page, so they
+    do not depend on the order pages arrive in. The IDs are recorded in the manifest
+    so the chunks can later be deleted when the PDF changes.
+    Each chunk is tagged with the product names it mentions ("products" metadata).
     """
-    loader = PyPDFDirectoryLoader(DATA_FOLDER)
-    documents = loader.load()
-    return documents
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    for document in documents:
+        source = document.metadata.get("source", "")
+        page = document.metadata.get("page", 0)
+        sha = manifest.get(source, {}).get("sha256", "")
+        for index, chunk in enumerate(text_splitter.split_documents([document])):
+            tag_products(chunk)
+            chunk_id = make_chunk_id(source, sha, f"{page}-{index}")
+            if source in manifest:
+                manifest[source].setdefault("chunk_ids", []).append(chunk_id)
+            yield chunk, chunk_id
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
-def create_knowledge_hub(documents):
+def add_chunks_in_batches(knowledge_hub, chunks, progress=None):
+    """
+    Embed (chunk, chunk_id) pairs in fixed-size batches, adding each batch to the
+    index before the next one is produced. Only one batch of chunks and vectors is
+    held in memory at a time.
+    If knowledge_hub is None, the index is created from the first batch.
+    progress(batch_number, chunk_count) is called after every batch.
+    Returns the (possibly new) knowledge hub.
+    """
+    chunk_count = 0
+    for batch_number, batch in enumerate(_batched(chunks, EMBED_BATCH_SIZE), start=1):
+        texts = [chunk.page_content for chunk, _ in batch]
+        metadatas = [chunk.metadata for chunk, _ in batch]
+        ids = [chunk_id for _, chunk_id in batch]
+        vectors = embeddings.embed_documents(texts)
+        if knowledge_hub is None:
+            knowledge_hub = FAISS.from_embeddings(
+                zip(texts, vectors), embeddings, metadatas=metadatas, ids=ids
+            )
+        else:
+            knowledge_hub.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+        chunk_count += len(batch)
+        if progress:
+            progress(batch_number, chunk_count)
+    return knowledge_hub
+
+
+def save_index_atomically(knowledge_hub, index_path, manifest, settings):
+    """
+    Write the index, its manifest, its product mention index and the per-product
+    context packs to a new version folder inside index_path
+    (e.g. faiss_index/v<timestamp>/), fsync it and then atomically point CURRENT
+    at it. Readers never see a half-written index, and the previous versions
+    are kept for rollback. Returns the new version name.
+    """
+    version_path = new_version_path(index_path)
+    save_knowledge_hub(knowledge_hub, version_path)
+    save_manifest(version_path, manifest, settings)
+    save_product_mentions(version_path, build_product_mentions(knowledge_hub))
+    save_context_packs(version_path, build_context_packs(knowledge_hub))
+    return publish_version(index_path, version_path)
+
+
+def _index_settings(chunk_size, chunk_overlap, index_factory=INDEX_FACTORY):
+    """Build settings recorded in the manifest; an index with other settings is rebuilt."""
+    return {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "index_factory": index_factory,
+        "format": INDEX_FORMAT,
+    }
+
+
+def index_vectors(knowledge_hub):
+    """
+    Return the exact vectors of all chunks as a float32 matrix in index order.
+    They are read back from indexes that store them uncompressed (flat, HNSW
+    and IVF flat); PQ and SQ indexes only store compressed vectors, so their
+    chunk texts are embedded again instead, which is served from the embedding cache.
+    """
+    index = knowledge_hub.index
+    if stores_exact_vectors(index):
+        return index.reconstruct_n(0, index.ntotal)
+    texts = [
+        knowledge_hub.docstore.search(knowledge_hub.index_to_docstore_id[position]).page_content
+        for position in range(index.ntotal)
+    ]
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def apply_index_factory(knowledge_hub, index_factory=INDEX_FACTORY):
+    """
+    Replace the index of a knowledge hub with one of the given factory type
+    (see functions/annIndex.py), keeping the chunk order. Chunks are always
+    embedded into a flat index first, so a flat factory keeps it as it is.
+    """
+    if not is_flat_factory(index_factory):
+        knowledge_hub.index = build_index(index_vectors(knowledge_hub), index_factory)
+    return knowledge_hub
+
+
+def create_knowledge_hub(
+    documents,
+    progress=None,
+    data_folder=DATA_FOLDER,
+    index_path=VECTOR_DB,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    index_factory=INDEX_FACTORY,
+):
     """
     Build and save the FAISS index (knowledge base) from the provided documents.
-    The index will be saved in a folder called "faiss_index".
+    The index will be saved as a new version in the "faiss_index" folder, together
+    with a manifest of the PDF hashes and chunk IDs used by update_knowledge_hub.
 
-    This function also splits the documents into manageable chunks using a text splitter.
+    documents may be a list or a generator of pages; they are split into chunks and
+    embedded in batches, so a generator keeps memory bounded during the build.
+    index_factory selects an exact ("Flat") or approximate index type.
     """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    split_documents = text_splitter.split_documents(documents)
-    knowledge_hub = FAISS.from_documents(split_documents, embeddings)
-    knowledge_hub.save_local(VECTOR_DB)
+    live_path = current_version_path(index_path)
+    manifest = scan_pdf_folder(data_folder, load_manifest(live_path) if live_path else {})
+    chunks = iter_chunks_with_ids(documents, manifest, chunk_size, chunk_overlap)
+    knowledge_hub = add_chunks_in_batches(None, chunks, progress)
+    if knowledge_hub is None:
+        raise ValueError(f"No text could be extracted from the PDFs in {data_folder}.")
+    apply_index_factory(knowledge_hub, index_factory)
+    settings = _index_settings(chunk_size, chunk_overlap, index_factory)
+    version = save_index_atomically(knowledge_hub, index_path, manifest, settings)
+    if os.path.abspath(index_path) == os.path.abspath(VECTOR_DB):
+        _publish_knowledge_hub(version)
     return knowledge_hub
 
 
-def get_knowledge_hub_instance():
+def build_knowledge_hub(
+    progress=None,
+    max_workers=None,
+    data_folder=DATA_FOLDER,
+    index_path=VECTOR_DB,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    index_factory=INDEX_FACTORY,
+):
     """
-    Loads the FAISS knowledge hub if it exists.
-    If not, it creates the knowledge hub by processing the PDFs in the docs folder.
+    Full rebuild that streams pages from the parallel PDF parser straight into
+    the batched embed step, without materializing the whole corpus.
     """
-    if os.path.exists(VECTOR_DB):
-        return FAISS.load_local(
-            VECTOR_DB, embeddings, allow_dangerous_deserialization=True
-        )
-    else:
-        documents = get_pdf_texts()
-        create_knowledge_hub(documents)
-        return FAISS.load_local(
-            VECTOR_DB, embeddings, allow_dangerous_deserialization=True
+    documents = iter_pdf_documents(list_pdf_files(data_folder), max_workers=max_workers)
+    return create_knowledge_hub(
+        documents, progress, data_folder, index_path, chunk_size, chunk_overlap, index_factory
+    )
+
+
+def update_knowledge_hub(
+    progress=None,
+    max_workers=None,
+    data_folder=DATA_FOLDER,
+    index_path=VECTOR_DB,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    index_factory=INDEX_FACTORY,
+):
+    """
+    Incrementally sync the FAISS index with the PDFs in the "docs" folder.
+    Only added or changed PDFs are parsed and embedded, and the chunks of
+    changed or removed PDFs are deleted from the index.
+    Falls back to a full build if there is no index or manifest yet, or if the
+    index was built with different chunk settings, index type or on-disk format.
+    Approximate indexes are updated on a flat copy and then rebuilt.
+    Returns a dict with the added, changed and removed PDF paths.
+    """
+    live_path = current_version_path(index_path)
+    previous = load_manifest(live_path) if live_path else {}
+    settings = _index_settings(chunk_size, chunk_overlap, index_factory)
+    if not previous or load_manifest_settings(live_path) != settings:
+        build_knowledge_hub(
+            progress, max_workers, data_folder, index_path, chunk_size, chunk_overlap,
+            index_factory,
         )
+        added = list(load_manifest(current_version_path(index_path)))
+        return {"added": added, "changed": [], "removed": []}
+
+    current = scan_pdf_folder(data_folder, previous)
+    added, changed, removed = diff_manifest(previous, current)
+    if not (added or changed or removed):
+        return {"added": added, "changed": changed, "removed": removed}
+
+    # Unchanged files keep their existing chunks.
+    for path in current:
+        if path not in added and path not in changed:
+            current[path]["chunk_ids"] = previous[path].get("chunk_ids", [])
 
+    knowledge_hub = load_knowledge_hub(live_path, embeddings, writable=True)
+    if not isinstance(knowledge_hub.index, faiss.IndexFlat):
+        flat_index = faiss.IndexFlatL2(knowledge_hub.index.d)
+        flat_index.add(index_vectors(knowledge_hub))
+        knowledge_hub.index = flat_index
+    stale_ids = [
+        chunk_id
+        for path in changed + removed
+        for chunk_id in previous[path].get("chunk_ids", [])
+    ]
+    if stale_ids:
+        knowledge_hub.delete(stale_ids)
 
-def get_conversational_chain(tool, ques):
+    documents = iter_pdf_documents(added + changed, max_workers=max_workers)
+    chunks = iter_chunks_with_ids(documents, current, chunk_size, chunk_overlap)
+    add_chunks_in_batches(knowledge_hub, chunks, progress)
+    apply_index_factory(knowledge_hub, index_factory)
+    version = save_index_atomically(knowledge_hub, index_path, current, settings)
+    if os.path.abspath(index_path) == os.path.abspath(VECTOR_DB):
+        _publish_knowledge_hub(version)
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def get_knowledge_base_version():
     """
-    Set up the conversational chain with your LLM and the retrieval tool.
+    Return the live index version (the name in faiss_index/CURRENT), or None if
+    no index has been published. The pointer only changes once a version is
+    completely written, or on rollback.
     """
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            ("placeholder", "{chat_history}"),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}"),
-        ]
-    )
-    agent = create_tool_calling_agent(azureLlm, [tool], prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=[tool], verbose=True)
-    response = agent_executor.invoke({"input": ques})
-    return response
+    return current_version(VECTOR_DB)
+
+
+def get_product_mentions(version):
+    """
+    Return {chunk ID: product names mentioned in the chunk} for an index version,
+    or None if it was built without a mention index.
+    """
+    return load_product_mentions(os.path.join(VECTOR_DB, version))
 
 
-async def generate_recipe(user_question):
+def get_context_packs(version):
+    """
+    Return {product name: context pack} for an index version, or None if it was
+    built without context packs.
+    """
+    return load_context_packs(os.path.join(VECTOR_DB, version))
+
+
+def get_product_candidates(version, knowledge_hub, products):
+    """
+    Return the index positions of the chunks that mention any of the products,
+    as an int64 array. Returns None if some product is not mentioned by any chunk
+    (e.g. it is not in the tagged catalog) or the version has no mention index,
+    in which case retrieval should search all chunks, so no product is left out.
+    """
+    global _product_positions_cache
+    cached_version, positions = _product_positions_cache
+    if cached_version != version:
+        mentions = get_product_mentions(version) or {}
+        positions = build_product_positions(mentions, knowledge_hub.index_to_docstore_id)
+        _product_positions_cache = (version, positions)
+    if not products or not all(positions.get(product) for product in products):
+        return None
+    candidates = sorted({p for product in products for p in positions[product]})
+    return np.asarray(candidates, dtype=np.int64)
+
+
+def _publish_knowledge_hub(version):
+    """
+    Swap a freshly written index into the process-wide cache. It is reopened from
+    disk, so the in-memory copy used for building can be freed.
+    """
+    global _knowledge_hub_cache
+    knowledge_hub = load_knowledge_hub(os.path.join(VECTOR_DB, version), embeddings)
+    with _knowledge_hub_lock:
+        _knowledge_hub_cache = (version, knowledge_hub)
+
+
+def get_pinned_knowledge_hub():
+    """
+    Returns (version, FAISS knowledge hub) for the live index. A request should
+    call this once and use both values throughout, so its retrieval and its cache
+    keys refer to the same version even if a rebuild is published meanwhile.
+    Published versions are never modified, so the hub stays valid after a swap.
+    The index is only loaded from disk when the live version differs from the
+    cached one (e.g. after a rebuild or rollback in another process).
+    If no index exists, it is built from the PDFs in the docs folder only when
+    BUILD_INDEX_ON_DEMAND is set; otherwise FileNotFoundError is raised, so a user
+    request never blocks on a full build.
+    """
+    global _knowledge_hub_cache
+    cached = _knowledge_hub_cache
+    if cached[1] is not None and cached[0] == get_knowledge_base_version():
+        return cached
+
+    with _knowledge_hub_lock:
+        # Another thread may have loaded the index while we waited for the lock.
+        cached = _knowledge_hub_cache
+        version = get_knowledge_base_version()
+        if cached[1] is not None and cached[0] == version:
+            return cached
+        if version is None:
+            if not BUILD_INDEX_ON_DEMAND:
+                raise FileNotFoundError(
+                    f"No knowledge base found at {VECTOR_DB}. Build it with "
+                    "'python build_index.py' or the Build/Update Knowledge Base button."
+                )
+            build_knowledge_hub()
+            return _knowledge_hub_cache
+        knowledge_hub = load_knowledge_hub(os.path.join(VECTOR_DB, version), embeddings)
+        _knowledge_hub_cache = (version, knowledge_hub)
+        return _knowledge_hub_cache
+
+
+def get_knowledge_hub_instance():
+    """Returns the process-wide FAISS knowledge hub of the live index version."""
+    return get_pinned_knowledge_hub()[1]
+
+
+def get_conversational_chain(knowledge_hub, ques, mode=RAG_MODE):
+    """
+    Answer the question with the recipe prompt, either in a single call with the
+    retrieved context inlined ("direct") or through the retriever-tool agent ("agent").
+    """
+    return answer_question("recipe", system_prompt, knowledge_hub, ques, mode)
+
+
+def _recipe_candidates(version, knowledge_hub, products):
+    if not (products and RECIPE_PRODUCT_FILTER):
+        return None
+    return get_product_candidates(version, knowledge_hub, products)
+
+
+async def _recipe_context(version, knowledge_hub, products):
+    """
+    The recipe context assembled from the context packs of the selected products.
+    Products without a pack (e.g. ones missing from the tagged catalog) get the
+    chunks retrieved for their names added, so none is left out. Returns None if
+    no selected product has a pack, in which case the context is retrieved.
+    """
+    if not (products and RECIPE_CONTEXT_PACKS):
+        return None
+    packs = get_context_packs(version) or {}
+    covered = [product for product in products if product in packs]
+    if not covered:
+        return None
+    context = format_packs(packs, covered)
+    missing = [product for product in products if product not in packs]
+    if missing:
+        candidates = get_product_candidates(version, knowledge_hub, missing)
+        try:
+            documents = await asearch_documents(
+                knowledge_hub, " ".join(missing), RAG_TOP_K, candidates
+            )
+        except Exception as e:
+            logger.warning("Could not retrieve context for %s: %s", missing, e)
+            return None
+        context += "\n\n" + format_context(documents)
+    return context
+
+
+async def _recipe_sources(version, knowledge_hub, products):
+    """Return (context, candidates) for a recipe request; see generate_recipe."""
+    context = await _recipe_context(version, knowledge_hub, products)
+    if context is not None:
+        return context, None
+    return None, _recipe_candidates(version, knowledge_hub, products)
+
+
+async def pin_knowledge_hub():
+    """
+    Return (version, FAISS knowledge hub) from get_pinned_knowledge_hub without
+    blocking the event loop, or None after showing an error if there is no index.
+    """
     try:
-        new_db = await asyncio.to_thread(get_knowledge_hub_instance)
+        return await asyncio.to_thread(get_pinned_knowledge_hub)
     except Exception as e:
         st.error("Error loading/creating the knowledge base. Please try updating it.")
+        return None
+
+
+async def generate_recipe(user_question, mode=RAG_MODE, products=None, pinned=None):
+    """
+    Generate a recipe for the question. If products are given, the context is
+    assembled from their precomputed context packs (see RECIPE_CONTEXT_PACKS),
+    with no vector search if every product has one; products without a pack get
+    their chunks retrieved. If none has a pack, the context is retrieved from the
+    chunks that mention them (see RECIPE_PRODUCT_FILTER).
+    pinned is the (version, knowledge hub) the caller keyed the recipe on; the
+    live one is pinned if it is not given.
+    """
+    pinned = pinned or await pin_knowledge_hub()
+    if pinned is None:
         return
+    version, new_db = pinned
 
-    retriever = new_db.as_retriever()
-    retrieval_chain = create_retriever_tool(
-        retriever,
-        "pdf_extractor",
-        "Tool to answer queries from the Canprev knowledge base PDFs.",
-    )
-    # Offload the blocking call to a thread:
-    response = await asyncio.to_thread(
-        get_conversational_chain, retrieval_chain, user_question
+    context, candidates = await _recipe_sources(version, new_db, products)
+    response = await aanswer_question(
+        "recipe", system_prompt, new_db, user_question, mode, candidates, context
     )
     return response
 
 
+async def stream_recipe(user_question, mode=RAG_MODE, products=None, pinned=None):
+    """Yield the recipe text chunk by chunk as the LLM generates it; see generate_recipe."""
+    pinned = pinned or await pin_knowledge_hub()
+    if pinned is None:
+        return
+    version, new_db = pinned
+
+    context, candidates = await _recipe_sources(version, new_db, products)
+    async for chunk in astream_answer(
+        "recipe", system_prompt, new_db, user_question, mode, candidates, context
+    ):
+        yield chunk
+
+
+async def write_stream_async(stream, placeholder):
+    """
+    Render an async stream of text chunks into a Streamlit placeholder as they arrive
+    and return the full text. st.write_stream cannot consume an async generator
+    while the app's own event loop is running.
+    """
+    text = ""
+    async for chunk in stream:
+        text += chunk
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
+
+
+def build_recipe_query(selected_products, custom_instructions=""):
+    """Combine the selected products and any custom instructions into one query."""
+    query = " ".join(selected_products)
+    if custom_instructions.strip():
+        query = f"generate a recipe using {query} and I want {custom_instructions.strip()}"
+    return query
+
+
+def build_image_description(selected_products, custom_instructions=""):
+    """
+    Describe the dish for the image prompt from the user's selection, so the image
+    can be generated at the same time as the recipe text instead of after it.
+    """
+    description = f"a healthy recipe made with {', '.join(selected_products)}"
+    if custom_instructions.strip():
+        description += f" that is {custom_instructions.strip()}"
+    return description
+
+
+async def fetch_image(url, retries=IMAGE_FETCH_RETRIES, timeout=IMAGE_FETCH_TIMEOUT):
+    """
+    Download a generated image once, right after generation (the URLs expire),
+    into the blob store and return its SHA-256; st.image and create_pdf then read
+    the local blob. Uses the pooled HTTP client, retrying timeouts, connection
+    errors and 429/5xx responses with backoff. Returns None if it fails.
+    """
+    error = None
+    for attempt in range(retries):
+        if attempt:
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+        try:
+            response = await get_async_http_client().get(url, timeout=timeout)
+        except Exception as e:
+            error = e  # timeout or connection error
+            continue
+        if response.status_code == 200:
+            return blob_store.put(response.content)
+        error = f"HTTP {response.status_code}"
+        if response.status_code != 429 and response.status_code < 500:
+            break  # e.g. an expired URL; retrying will not help
+    logger.warning("Could not download the recipe image: %s", error)
+    return None
+
+
+def render_recipe_pdf(recipe_key, recipe_text, image_sha):
+    """
+    Return the blob SHA-256 of a stored recipe's PDF, rendering it and recording
+    it in the recipe store first if it has not been rendered yet.
+    """
+    pdf_sha = get_recipe_store().get_pdf_sha(recipe_key, recipe_text, image_sha)
+    if blob_store.exists(pdf_sha):
+        return pdf_sha
+    recipe_name, cleaned_text = parse_recipe_name(recipe_text)
+    pdf_sha = blob_store.put(create_pdf(recipe_name, blob_store.path(image_sha), cleaned_text))
+    get_recipe_store().set_pdf_sha(recipe_key, recipe_text, image_sha, pdf_sha)
+    return pdf_sha
+
+
+def request_recipe_pdf(recipe_key, recipe_text, image_sha):
+    """
+    Start rendering a recipe's PDF in a background thread, or join the render
+    already running for the same text and image; a regenerated recipe with the
+    same key gets its own render. Returns a Future of the PDF's blob SHA-256.
+    """
+    text_sha = hashlib.sha256(recipe_text.encode("utf-8")).hexdigest()
+    job_key = (recipe_key, text_sha, image_sha)
+    with _pdf_jobs_lock:
+        job = _pdf_jobs.get(job_key)
+        if job is None:
+            job = _pdf_executor.submit(render_recipe_pdf, recipe_key, recipe_text, image_sha)
+            _pdf_jobs[job_key] = job
+            job.add_done_callback(lambda _: _pdf_jobs.pop(job_key, None))
+        return job
+
+
 async def generate_recipe_image(recipe_description: str):
     """Generate a high-quality, appetizing image for a dish described by the given text."""
     prompt = (
@@ -113,8 +648,10 @@ async def generate_recipe_image(recipe_description: str):
     
 )
 
-    try:            
-        response = imageClient.images.generate(prompt=prompt, n=1, size="1024x1024",model="dall-e-3")
+    try:
+        response = await get_async_image_client().images.generate(
+            prompt=prompt, n=1, size="1024x1024", model="dall-e-3"
+        )
         return response.data[0].url
     except Exception as e:
         return None
@@ -133,9 +670,3 @@ async def generate_recipe_image(recipe_description: str):
 #     )
 #     result = await generate_recipe(query)
 #     return result["output"]
-
-
-def stream_data(content):
-    for word in content.split(" "):
-        yield word + " "
-        time.sleep(0.02)
@@ -0,0 +1,109 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from functions.responseCache import normalize_query
+
+
+def make_recipe_key(products, custom_instructions, prompt_version, kb_version):
+    """
+    Deterministic key for a recipe request: the same products in any order and the
+    same instructions up to case and whitespace map to the same key, for a given
+    prompt and knowledge-base version.
+    """
+    payload = json.dumps(
+        [sorted(products), normalize_query(custom_instructions), prompt_version, kb_version]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecipeStore:
+    """
+    Persistent store of generated recipes, shared by all sessions and processes.
+    Recipe text and metadata are kept in SQLite; the image and PDF are referenced
+    by the SHA-256 of their blobs in the given BlobStore.
+    """
+
+    def __init__(self, sqlite_path, blob_store):
+        self.blob_store = blob_store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS recipes ("
+            "key TEXT PRIMARY KEY, products TEXT, instructions TEXT, prompt_version TEXT, "
+            "kb_version TEXT, name TEXT, text TEXT, image_sha TEXT, pdf_sha TEXT, "
+            "created_at REAL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        """
+        Return the stored recipe as a dict with "name", "text", "image_sha" and
+        "pdf_sha" (blob SHA-256 or None), or None if there is none or its image
+        blob has been deleted.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, text, image_sha, pdf_sha FROM recipes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or not self.blob_store.exists(row[2]):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"name": row[0], "text": row[1], "image_sha": row[2], "pdf_sha": row[3]}
+
+    def put(self, key, products, custom_instructions, prompt_version, kb_version,
+            name, text, image_sha=None, pdf_sha=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(sorted(products)),
+                    normalize_query(custom_instructions),
+                    prompt_version,
+                    kb_version,
+                    name,
+                    text,
+                    image_sha,
+                    pdf_sha,
+                    time.time(),
+                ),
+            )
+            self._db.commit()
+
+    def get_pdf_sha(self, key, text, image_sha):
+        """The PDF of the stored recipe, if it still has this text and image."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pdf_sha FROM recipes WHERE key = ? AND text = ? AND image_sha = ?",
+                (key, text, image_sha),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_pdf_sha(self, key, text, image_sha, pdf_sha):
+        """
+        Record the PDF rendered from the given text and image. It is not recorded
+        if the recipe has been regenerated meanwhile, so a stale PDF is never
+        attached to the new recipe.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE recipes SET pdf_sha = ? WHERE key = ? AND text = ? AND image_sha = ?",
+                (pdf_sha, key, text, image_sha),
+            )
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            size = self._db.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": size,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,111 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"[\s?.!]+$", "", " ".join(query.lower().split()))
+
+
+def make_cache_key(query, version):
+    return f"{version}|{normalize_query(query)}"
+
+
+class ResponseCache:
+    """
+    Process-wide, thread-safe LRU cache with a per-entry TTL for LLM responses.
+    Values must be JSON-serializable. If sqlite_path is given, entries are also
+    written to SQLite so they survive restarts and are shared between processes;
+    the in-memory LRU sits in front of it.
+    """
+
+    def __init__(self, name, max_entries=1000, ttl_seconds=24 * 3600, sqlite_path=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, last_used REAL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, expires_at FROM {self.name} WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._db.execute(
+                        f"UPDATE {self.name} SET last_used = ? WHERE key = ?", (now, key)
+                    )
+                    self._db.commit()
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.name} VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now),
+                )
+                # Drop expired rows and keep only the most recently used max_entries.
+                self._db.execute(
+                    f"DELETE FROM {self.name} WHERE expires_at <= ? OR key NOT IN "
+                    f"(SELECT key FROM {self.name} ORDER BY last_used DESC LIMIT ?)",
+                    (now, self.max_entries),
+                )
+                self._db.commit()
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.name}")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,30 +1,66 @@
 import json
+import logging
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from services.utils import azureLlm, Azureclient
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_core.prompts import ChatPromptTemplate
-from functions.recipeProcessor import get_knowledge_hub_instance
-from langchain.tools.retriever import create_retriever_tool
+from services.utils import get_azure_client
+from functions.chains import answer_question, stream_answer
+from functions.recipeProcessor import (
+    embeddings,
+    get_knowledge_hub_instance,
+    get_knowledge_base_version,
+    get_pinned_knowledge_hub,
+)
+from functions.autocomplete import get_autocomplete_index
 from services.prompt import system_prompt_search_bar
+from functions.responseCache import ResponseCache, make_cache_key
+from functions.semanticCache import SemanticAnswerCache
+from services.constants import (
+    AUTOCOMPLETE_LLM_REFINEMENT,
+    RAG_MODE,
+    RESPONSE_CACHE_DB,
+    SEMANTIC_CACHE_THRESHOLD,
+)
 
+logger = logging.getLogger(__name__)
 
+# Shared by all Streamlit sessions in this process. Keys include the
+# knowledge-base version, so a rebuild makes old entries unreachable.
+autocomplete_cache = ResponseCache("autocomplete", max_entries=5000, ttl_seconds=24 * 3600)
+# Catches paraphrases that miss the exact-match answer cache.
+semantic_answer_cache = SemanticAnswerCache(embeddings, threshold=SEMANTIC_CACHE_THRESHOLD)
 
+# Background GPT-4o suggestion requests that have not finished yet.
+_pending_llm_suggestions = set()
+_llm_executor = ThreadPoolExecutor(max_workers=2)
 
-def get_autocomplete_suggestions(partial_query):
+
+@lru_cache(maxsize=None)
+def get_answer_cache():
     """
-    Given a partial query, ask GPT-4o to suggest completions that focus on Canprev products.
-    Returns a list of suggestion strings.
-    Caches results in session_state to avoid repeated calls.
+    The answer cache, persisted in RESPONSE_CACHE_DB. It is opened on first use,
+    so importing this module does not create the database.
     """
-    if not partial_query or len(partial_query) < 3:
-        return []
+    return ResponseCache(
+        "answers", max_entries=1000, ttl_seconds=7 * 24 * 3600, sqlite_path=RESPONSE_CACHE_DB
+    )
+
 
-    if "autocomplete_cache" not in st.session_state:
-        st.session_state.autocomplete_cache = {}
+def _load_chunk_texts():
+    """Chunk texts from the saved knowledge base, without triggering a build."""
+    if get_knowledge_base_version() is None:
+        return []
+    knowledge_db = get_knowledge_hub_instance()
+    return list(knowledge_db.docstore.texts())
 
-    if partial_query in st.session_state.autocomplete_cache:
-        return st.session_state.autocomplete_cache[partial_query]
 
+def get_llm_suggestions(partial_query, cache_key=None):
+    """
+    Ask GPT-4o to suggest completions that focus on Canprev products.
+    Returns a list of suggestion strings (empty on any error) and stores
+    successful results in autocomplete_cache under cache_key.
+    Runs in a background thread, so it must not call Streamlit.
+    """
     # Updated prompt: Focus specifically on Canprev products.
     prompt = (
         f"Given the following partial question about Canprev products: '{partial_query}', "
@@ -34,7 +70,7 @@ def get_autocomplete_suggestions(partial_query):
         "and do not include any extra text."
     )
     try:
-        response = Azureclient.chat.completions.create(
+        response = get_azure_client().chat.completions.create(
             model="gpt-4o",  # Adjust if needed.
             messages=[
                 {
@@ -54,11 +90,40 @@ def get_autocomplete_suggestions(partial_query):
         suggestions = json.loads(suggestions_str)
         if not isinstance(suggestions, list):
             suggestions = []
+        if cache_key:
+            autocomplete_cache.set(cache_key, suggestions)
     except Exception as e:
-        st.error(f"Suggestion error: {e}")
+        # Runs in a background thread, where st.error cannot be shown.
+        logger.warning("Suggestion error: %s", e)
         suggestions = []
+    finally:
+        _pending_llm_suggestions.discard(cache_key)
+    return suggestions
+
+
+def get_autocomplete_suggestions(partial_query, refine_with_llm=AUTOCOMPLETE_LLM_REFINEMENT):
+    """
+    Given a partial query, return completions from the local autocomplete index
+    (product names, categories and knowledge-base phrases).
+    If refine_with_llm is set, GPT-4o suggestions are fetched in the background and
+    shown ahead of the local ones on a later rerun, once they have arrived.
+    Returns a list of suggestion strings.
+    """
+    if not partial_query or len(partial_query) < 3:
+        return []
 
-    st.session_state.autocomplete_cache[partial_query] = suggestions
+    version = get_knowledge_base_version()
+    index = get_autocomplete_index(version, _load_chunk_texts)
+    suggestions = index.suggest(partial_query)
+
+    if refine_with_llm:
+        cache_key = make_cache_key(partial_query, version)
+        refined = autocomplete_cache.get(cache_key)
+        if refined is not None:
+            suggestions = list(dict.fromkeys(refined + suggestions))[:3]
+        elif cache_key not in _pending_llm_suggestions:
+            _pending_llm_suggestions.add(cache_key)
+            _llm_executor.submit(get_llm_suggestions, partial_query, cache_key)
     return suggestions
 
 
@@ -70,40 +135,67 @@ def update_autocomplete():
     pass
 
 
-def get_conversational_chain_search_bar(tool, ques):
+def get_conversational_chain_search_bar(knowledge_hub, ques, mode=RAG_MODE):
     """
-    Set up the conversational chain with your LLM and the retrieval tool.
+    Answer the question with the Q&A prompt, either in a single call with the
+    retrieved context inlined ("direct") or through the retriever-tool agent ("agent").
     """
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt_search_bar),
-            ("placeholder", "{chat_history}"),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}"),
-        ]
-    )
-    agent = create_tool_calling_agent(azureLlm, [tool], prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=[tool], verbose=True)
-    response = agent_executor.invoke({"input": ques})
-    return response
+    return answer_question("search_bar", system_prompt_search_bar, knowledge_hub, ques, mode)
 
 
-def generate_knowledge_answer(query):
+def generate_knowledge_answer(query, mode=RAG_MODE):
     """
     Loads (or creates) the knowledge hub, creates a retrieval tool,
     and then generates an answer to the query using the conversational chain.
+    Answers are cached across sessions by normalized query and knowledge-base version,
+    and near-duplicate questions reuse a previous answer through the semantic cache.
     """
     try:
-        knowledge_db = get_knowledge_hub_instance()
+        version, knowledge_db = get_pinned_knowledge_hub()
     except Exception as e:
         st.error("Error loading/creating the knowledge base. Please try updating it.")
         return {"output": "Error loading knowledge base."}
 
-    retriever = knowledge_db.as_retriever()
-    retrieval_chain = create_retriever_tool(
-        retriever,
-        "pdf_extractor",
-        "Tool to answer queries from the Canprev knowledge base PDFs.",
-    )
-    response = get_conversational_chain_search_bar(retrieval_chain, query)
-    return response
+    cache_key = make_cache_key(query, version)
+    cached = get_answer_cache().get(cache_key)
+    if cached is not None:
+        return cached
+    cached, query_vector = semantic_answer_cache.lookup(query, version)
+    if cached is not None:
+        return cached
+
+    response = get_conversational_chain_search_bar(knowledge_db, query, mode)
+    answer = {"output": response["output"]}
+    get_answer_cache().set(cache_key, answer)
+    semantic_answer_cache.add(query, query_vector, answer, version)
+    return answer
+
+
+def stream_knowledge_answer(query, mode=RAG_MODE):
+    """
+    Generator version of generate_knowledge_answer for st.write_stream: yields the
+    answer as the LLM produces it. Cached answers are yielded in one piece, and a
+    completed answer is stored in both caches.
+    """
+    try:
+        version, knowledge_db = get_pinned_knowledge_hub()
+    except Exception as e:
+        st.error("Error loading/creating the knowledge base. Please try updating it.")
+        yield "Error loading knowledge base."
+        return
+
+    cache_key = make_cache_key(query, version)
+    cached = get_answer_cache().get(cache_key)
+    if cached is None:
+        cached, query_vector = semantic_answer_cache.lookup(query, version)
+    if cached is not None:
+        yield cached["output"]
+        return
+
+    output = ""
+    for chunk in stream_answer("search_bar", system_prompt_search_bar, knowledge_db, query, mode):
+        output += chunk
+        yield chunk
+    answer = {"output": output}
+    get_answer_cache().set(cache_key, answer)
+    semantic_answer_cache.add(query, query_vector, answer, version)
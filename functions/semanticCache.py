@@ -0,0 +1,102 @@
+import threading
+import numpy as np
+import faiss
+from functions.productMentions import get_product_matcher
+
+# Neighbours checked per lookup, for when the nearest ones are about other products.
+LOOKUP_CANDIDATES = 5
+
+
+class SemanticAnswerCache:
+    """
+    Reuses answers for paraphrased questions. Past questions are embedded into a
+    small dedicated FAISS inner-product index over L2-normalized vectors, so the
+    search score is the cosine similarity. A lookup returns the stored answer of
+    the nearest past question that scores at least `threshold` and mentions the
+    same products: "benefits of Krill Oil" and "benefits of Fish Oil" can score
+    above the threshold but must not share an answer.
+
+    The cache is tied to a knowledge-base version and is emptied when it changes.
+    """
+
+    def __init__(self, embeddings, threshold=0.92, max_entries=2000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+        self._vectors = []
+        self._answers = []
+        self._products = []
+
+    def _embed(self, query):
+        vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _reset(self, version):
+        self._version = version
+        self._index = None
+        self._vectors = []
+        self._answers = []
+        self._products = []
+
+    @staticmethod
+    def _product_set(query):
+        return frozenset(get_product_matcher().find(query))
+
+    def lookup(self, query, version):
+        """
+        Return (answer, vector). answer is None on a miss; vector can be passed
+        to add() so the question is not embedded twice.
+        """
+        vector = self._embed(query)
+        products = self._product_set(query)
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            if self._index is not None and self._index.ntotal:
+                scores, ids = self._index.search(vector, LOOKUP_CANDIDATES)
+                for score, i in zip(scores[0], ids[0]):
+                    if i == -1 or score < self.threshold:
+                        break
+                    if self._products[i] == products:
+                        self.hits += 1
+                        return self._answers[i], vector
+            self.misses += 1
+        return None, vector
+
+    def add(self, query, vector, answer, version):
+        """Store the answer to a question; vector is the one lookup() returned."""
+        products = self._product_set(query)
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            if len(self._answers) >= self.max_entries:
+                # Keep the most recent half; rebuilding a small flat index is cheap.
+                keep = self.max_entries // 2
+                self._vectors = self._vectors[-keep:]
+                self._answers = self._answers[-keep:]
+                self._products = self._products[-keep:]
+                self._index = None
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(vector.shape[1])
+                if self._vectors:
+                    self._index.add(np.vstack(self._vectors))
+            self._index.add(vector)
+            self._vectors.append(vector)
+            self._answers.append(answer)
+            self._products.append(products)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._answers),
+                "hit_rate": self.hits / total if total else 0.0,
+            }
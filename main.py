@@ -2,17 +2,65 @@ import os
 import asyncio
 import streamlit as st
 from functions.product_details import product_categories, product_images
-from functions.pdf import parse_recipe_name, create_pdf
+from functions.pdf import parse_recipe_name
 from functions.recipeProcessor import (
-    get_pdf_texts,
-    create_knowledge_hub,
-    generate_recipe,
-    stream_data,
+    update_knowledge_hub,
+    stream_recipe,
+    write_stream_async,
     generate_recipe_image,
+    build_recipe_query,
+    build_image_description,
+    fetch_image,
+    request_recipe_pdf,
+    pin_knowledge_hub,
+    blob_store,
+    get_recipe_store,
+    RECIPE_PROMPT_VERSION,
 )
+from functions.recipeStore import make_recipe_key
+from functions.batchGenerator import products_for_categories, default_output_dir, run_batch
 from services.constants import CANPREV_IMAGE_PATH
 
 
+async def show_pdf_download(recipe_key, recipe_name, recipe_text, image_sha):
+    """
+    Offer the recipe as a PDF. It is called once the recipe is displayed; the PDF
+    is rendered in a background thread, only once per recipe, and kept in the
+    recipe store, so reruns and repeat visits reuse it.
+    """
+    try:
+        with st.spinner("Preparing the PDF..."):
+            pdf_sha = await asyncio.wrap_future(
+                request_recipe_pdf(recipe_key, recipe_text, image_sha)
+            )
+    except Exception as e:
+        st.error("Error generating PDF.")
+        return
+    safe_name = recipe_name if recipe_name else "Recipe"
+    st.download_button(
+        label="Download Recipe as PDF",
+        data=blob_store.get(pdf_sha),
+        file_name=f"{safe_name}_recipe.pdf",
+        mime="application/pdf",
+        type="primary",
+    )
+
+
+async def show_stored_recipe(recipe_key, recipe, selected_products):
+    """Display a recipe from the recipe store in the same layout as a new one."""
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        st.markdown("### Recipe Details")
+        st.markdown(recipe["text"])
+    with col2:
+        st.markdown("### Recipe Image")
+        st.image(
+            blob_store.get(recipe["image_sha"]),
+            caption=", ".join(selected_products),
+            width=400,
+        )
+    with col1:
+        await show_pdf_download(recipe_key, recipe["name"], recipe["text"], recipe["image_sha"])
 
 
 async def main():
@@ -63,9 +111,17 @@ async def main():
         # Option to build/update the knowledge base
         if st.button("Build/Update Knowledge Base", type="primary"):
             with st.spinner("Building the knowledge base from PDF files..."):
-                documents = get_pdf_texts()
-                create_knowledge_hub(documents)
-                st.success("Knowledge Base updated successfully!")
+                build_status = st.empty()
+                changes = update_knowledge_hub(
+                    progress=lambda batch, chunks: build_status.caption(
+                        f"Embedded batch {batch} ({chunks} chunks so far)"
+                    )
+                )
+                st.success(
+                    "Knowledge Base updated successfully! "
+                    f"({len(changes['added'])} added, {len(changes['changed'])} changed, "
+                    f"{len(changes['removed'])} removed)"
+                )
 
     # Optional custom instructions
     custom_instructions = ""
@@ -76,61 +132,121 @@ async def main():
             height=68,
         )
 
+    # Batch mode: one recipe card per product of the selected categories
+    with st.expander("Batch Recipe Cards"):
+        st.caption(
+            "Generate a recipe card (recipe, image and PDF) for every product in the "
+            "selected categories, using the custom instructions above. An interrupted "
+            "batch resumes where it stopped."
+        )
+        if st.button("Generate Recipe Cards", disabled=not selected_categories):
+            batch_products = products_for_categories(selected_categories)
+            output_dir = default_output_dir("-".join(selected_categories))
+            progress_bar = st.progress(0.0, text=f"0/{len(batch_products)} recipe cards")
+            try:
+                manifest = await run_batch(
+                    batch_products,
+                    output_dir,
+                    custom_instructions=custom_instructions,
+                    progress=lambda finished, total, product, entry: progress_bar.progress(
+                        finished / total, text=f"{finished}/{total} recipe cards ({product})"
+                    ),
+                )
+            except Exception as e:
+                st.error(f"Batch generation failed: {e}")
+            else:
+                st.success(
+                    f"{manifest['done']} recipe cards done, {manifest['failed']} failed in "
+                    f"{manifest['duration_seconds']}s. PDFs are in {output_dir}/pdfs."
+                )
+                failed = {
+                    product: entry.get("error")
+                    for product, entry in manifest["items"].items()
+                    if entry.get("status") != "done"
+                }
+                if failed:
+                    st.write("Failed products (run the batch again to retry):", failed)
+
+    # Recipes are saved; the same selection is served from the recipe store
+    # unless the user asks for a new one.
+    regenerate = st.checkbox("Regenerate (ignore the saved recipe)")
+
     # Generate Recipe Button
     if st.button("Generate Recipe", type="primary"):
         if not selected_products:
             st.warning("Please select at least one product.")
         else:
-            with st.spinner(
-                "Hold on... our genius chef is busy inventing a recipe for you...!"
-            ):
-                # Combine selected products into a single query
-                final_query = " ".join(selected_products)
-                # Append any custom instructions
-                if custom_instructions.strip():
-                    final_query = f"generate a recipe using {final_query} and I want {custom_instructions.strip()}"
-                    # final_query += " " + custom_instructions.strip()
-
-                # 1) Generate the recipe text
-                recipe_text = await generate_recipe(final_query)
-                # 2) Extract recipe name (if any)
-                recipe_name, cleaned_text = parse_recipe_name(recipe_text["output"])
-                # 3) Generate the recipe image
-                recipe_image_url = await generate_recipe_image(recipe_text["output"])
+            # The recipe is keyed on, and generated from, the same index version.
+            pinned = await pin_knowledge_hub()
+            if pinned is None:
+                return
+            kb_version = pinned[0]
+            recipe_key = make_recipe_key(
+                selected_products, custom_instructions, RECIPE_PROMPT_VERSION, kb_version
+            )
+            stored = None if regenerate else get_recipe_store().get(recipe_key)
+            if stored:
+                await show_stored_recipe(recipe_key, stored, selected_products)
+                return
+
+            # Combine selected products and any custom instructions into a single query
+            final_query = build_recipe_query(selected_products, custom_instructions)
+
+            # Start the image right away so it is generated while the recipe text
+            # streams; its prompt is built from the selection, not the finished recipe.
+            image_task = asyncio.create_task(
+                generate_recipe_image(
+                    build_image_description(selected_products, custom_instructions)
+                )
+            )
 
             # Display results in a two-column layout
             col1, col2 = st.columns([2, 1])
+            with col1:
+                st.markdown("### Recipe Details")
+                with st.spinner(
+                    "Hold on... our genius chef is busy inventing a recipe for you...!"
+                ):
+                    recipe_output = await write_stream_async(
+                        stream_recipe(final_query, products=selected_products, pinned=pinned),
+                        st.empty(),
+                    )
+            if not recipe_output:
+                image_task.cancel()
+                return
+            # Extract recipe name (if any)
+            recipe_name, _ = parse_recipe_name(recipe_output)
+
             with col2:
                 st.markdown("### Recipe Image")
-                if recipe_image_url:
+                with st.spinner("Plating your dish..."):
+                    recipe_image_url = await image_task
+                    # Downloaded once into the local blob store, which the image
+                    # and the PDF are read from.
+                    image_sha = await fetch_image(recipe_image_url) if recipe_image_url else None
+                if image_sha:
                     st.image(
-                        recipe_image_url,
+                        blob_store.get(image_sha),
                         caption=", ".join(selected_products),
                         width=400,
                     )
                 else:
                     st.warning("Could not generate recipe image.")
 
-            with col1:
-                st.markdown("### Recipe Details")
-                with st.spinner("Chef's recipe is almost ready..."):
-                    await asyncio.sleep(2)
-                st.write_stream(stream_data(recipe_text["output"]))
-
-                # Offer a PDF download
-                if recipe_image_url and cleaned_text:
-                    pdf_bytes = create_pdf(recipe_name, recipe_image_url, cleaned_text)
-                    if pdf_bytes:
-                        safe_name = recipe_name if recipe_name else "Recipe"
-                        st.download_button(
-                            label="Download Recipe as PDF",
-                            data=pdf_bytes,
-                            file_name=f"{safe_name}_recipe.pdf",
-                            mime="application/pdf",
-                            type="primary",
-                        )
-                    else:
-                        st.error("Error generating PDF.")
+            # Only complete results are saved, so a failed image is retried next time.
+            if image_sha:
+                get_recipe_store().put(
+                    recipe_key,
+                    selected_products,
+                    custom_instructions,
+                    RECIPE_PROMPT_VERSION,
+                    kb_version,
+                    recipe_name,
+                    recipe_output,
+                    image_sha=image_sha,
+                )
+                with col1:
+                    await show_pdf_download(recipe_key, recipe_name, recipe_output, image_sha)
 
 
 if __name__ == "__main__":
@@ -2,15 +2,18 @@ import os
 import streamlit as st
 from functions.product_details import product_categories, product_images
 from functions.recipeProcessor import (
-    get_pdf_texts,
-    create_knowledge_hub,
-    get_knowledge_hub_instance,
-    stream_data,
+    update_knowledge_hub,
+    get_pinned_knowledge_hub,
+    get_product_mentions,
 )
+from functions.productMentions import get_product_matcher
 from functions.searchBarProcessor import (
     get_autocomplete_suggestions,
     update_autocomplete,
-    generate_knowledge_answer,
+    stream_knowledge_answer,
+    get_answer_cache,
+    autocomplete_cache,
+    semantic_answer_cache,
 )
 from services.constants import CANPREV_IMAGE_PATH
 
@@ -19,24 +22,26 @@ from services.constants import CANPREV_IMAGE_PATH
 def get_similar_products_kb(query):
     """
     Load the knowledge base, retrieve relevant documents for the query,
-    then search those documents for known product names (from product_images).
+    then look up the known product names (from product_images) those documents
+    mention in the product mention index built with the knowledge base.
     Returns a list of matching product names. If none are found, return a default list.
     """
     try:
-        knowledge_db = get_knowledge_hub_instance()
+        version, knowledge_db = get_pinned_knowledge_hub()
     except Exception as e:
         st.error("Error loading knowledge base. Please try updating it.")
         return []
 
     retriever = knowledge_db.as_retriever(search_type="mmr", search_kwargs={"k": 1})
     results = retriever.get_relevant_documents(query)
+    mentions = get_product_mentions(version)
     similar = set()
-    # For each retrieved document, check if any known product name appears.
     for doc in results:
-        text = doc.page_content
-        for product in product_images.keys():
-            if product.lower() in text.lower():
-                similar.add(product)
+        if mentions is not None:
+            similar.update(mentions.get(doc.id, []))
+        else:
+            # Index built before mention indexes: match the retrieved text directly.
+            similar.update(get_product_matcher().find(doc.page_content))
     # Fallback: if no similar products found, return the first 3 products as default.
     if not similar:
         similar = set(list(product_images.keys())[:3])
@@ -44,6 +49,20 @@ def get_similar_products_kb(query):
     return list(similar)
 
 
+def write_streamed_answer(query):
+    """
+    Stream the answer into a temporary chat exchange and return the full text.
+    The placeholder is cleared afterwards because the conversation section
+    below renders the stored history.
+    """
+    live_answer = st.empty()
+    with live_answer.container():
+        st.chat_message("user").write(query)
+        output = st.chat_message("assistant").write_stream(stream_knowledge_answer(query))
+    live_answer.empty()
+    return output
+
+
 def display_similar_products(similar_products):
     """
     Display similar products as image thumbnails.
@@ -77,9 +96,21 @@ def main():
         st.markdown("---")
         if st.button("Build/Update Knowledge Base", type="primary"):
             with st.spinner("Building the knowledge base from PDF files..."):
-                documents = get_pdf_texts()
-                create_knowledge_hub(documents)
-                st.success("Knowledge Base updated successfully!")
+                build_status = st.empty()
+                changes = update_knowledge_hub(
+                    progress=lambda batch, chunks: build_status.caption(
+                        f"Embedded batch {batch} ({chunks} chunks so far)"
+                    )
+                )
+                st.success(
+                    "Knowledge Base updated successfully! "
+                    f"({len(changes['added'])} added, {len(changes['changed'])} changed, "
+                    f"{len(changes['removed'])} removed)"
+                )
+        with st.expander("Response cache statistics"):
+            st.write("Answers", get_answer_cache().stats())
+            st.write("Similar questions", semantic_answer_cache.stats())
+            st.write("Autocomplete", autocomplete_cache.stats())
 
     # Main title and instructions.
     st.title("Product Q&A")
@@ -108,15 +139,14 @@ def main():
             if st.button(suggestion, key=suggestion, type="primary"):
                 # Update effective query without modifying the widget value.
                 st.session_state.effective_query = suggestion
-                with st.spinner("Thinking..."):
-                    answer_response = generate_knowledge_answer(suggestion)
+                answer_output = write_streamed_answer(suggestion)
                 if "chat_history" not in st.session_state:
                     st.session_state.chat_history = []
                 st.session_state.chat_history.append(
                     {"role": "user", "content": suggestion}
                 )
                 st.session_state.chat_history.append(
-                    {"role": "assistant", "content": answer_response.get("output", "")}
+                    {"role": "assistant", "content": answer_output}
                 )
 
     # Ensure conversation history exists.
@@ -126,13 +156,12 @@ def main():
     # When the user clicks "Submit".
     if st.button("Submit", type="primary"):
         if user_query:
-            with st.spinner("Thinking..."):
-                answer_response = generate_knowledge_answer(user_query)
+            answer_output = write_streamed_answer(user_query)
             st.session_state.chat_history.append(
                 {"role": "user", "content": user_query}
             )
             st.session_state.chat_history.append(
-                {"role": "assistant", "content": answer_response.get("output", "")}
+                {"role": "assistant", "content": answer_output}
             )
 
     # Display conversation messages.
@@ -1,3 +1,37 @@
 DATA_FOLDER="docs"
 VECTOR_DB = "faiss_index"
-CANPREV_IMAGE_PATH = "https://canprev.ca/wp-content/uploads/2024/02/CanPrev_4D-logo-no-tagline-no-TM.png"
\ No newline at end of file
+MANIFEST_FILE = "manifest.json"
+INDEX_VERSIONS_TO_KEEP = 3
+INDEX_FACTORY = "Flat"
+INDEX_TRAIN_SAMPLE = 50000
+INDEX_NPROBE = 16
+INDEX_EF_SEARCH = 64
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+BUILD_INDEX_ON_DEMAND = False
+PDF_PAGES_PER_TASK = 8
+EMBED_BATCH_SIZE = 512
+EMBED_MAX_CONCURRENCY = 4
+EMBED_REQUEST_MAX_INPUTS = 128
+EMBED_REQUEST_MAX_TOKENS = 100000
+EMBED_TOKENS_PER_MINUTE = 1000000
+EMBEDDING_CACHE_DIR = "embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 50000
+AUTOCOMPLETE_LLM_REFINEMENT = False
+RESPONSE_CACHE_DB = "response_cache.db"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+RAG_MODE = "direct"
+RAG_TOP_K = 4
+RECIPE_PRODUCT_FILTER = True
+RECIPE_CONTEXT_PACKS = True
+CONTEXT_PACK_MAX_TOKENS = 300
+RECIPE_STORE_DB = "recipe_store.db"
+RECIPE_BLOB_DIR = "recipe_blobs"
+IMAGE_FETCH_TIMEOUT = 30.0
+IMAGE_FETCH_RETRIES = 3
+BATCH_OUTPUT_DIR = "batch_runs"
+BATCH_WORKERS = 8
+BATCH_LLM_CONCURRENCY = 4
+BATCH_IMAGE_CONCURRENCY = 2
+BATCH_RETRIES = 2
+CANPREV_IMAGE_PATH = "https://canprev.ca/wp-content/uploads/2024/02/CanPrev_4D-logo-no-tagline-no-TM.png"
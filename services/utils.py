@@ -1,24 +1,107 @@
+import asyncio
+import weakref
+from functools import lru_cache
 import streamlit as st
-from openai import OpenAI
-from langchain_openai import AzureChatOpenAI
-from openai import AzureOpenAI
 
 # llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
 
-azureLlm = AzureChatOpenAI(
-    api_key=st.secrets.get("AZURE_OPENAI_API_KEY"),
-    api_version=st.secrets.get("AZURE_API_VERSION"),
-    azure_deployment=st.secrets.get("AZURE_DEPLOYMENT_MODEL"),
-    azure_endpoint=st.secrets.get("AZURE_ENDPOINT"),
-    temperature=0.3,
-)
-
-Azureclient = AzureOpenAI(
-    api_key=st.secrets.get("AZURE_OPENAI_API_KEY"),
-    api_version=st.secrets.get("AZURE_API_VERSION"),
-    azure_deployment=st.secrets.get("AZURE_DEPLOYMENT_MODEL"),
-    azure_endpoint=st.secrets.get("AZURE_ENDPOINT"),
-)
-
-openai_api_key = st.secrets.get("OPENAI_API_KEY")
-imageClient = OpenAI(api_key=openai_api_key)
+# Clients are created on first use instead of at import time, so importing the
+# processors (index builds, benchmarks) needs neither the secrets nor the
+# openai/langchain_openai imports. All clients share pooled keep-alive HTTP clients.
+
+HTTP_TIMEOUT = 60.0
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Async HTTP clients are bound to the event loop they run in, and main.py runs
+# every Streamlit rerun in a new loop, so async clients are kept per running loop.
+_loop_clients = weakref.WeakKeyDictionary()
+
+
+def _http_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=60,
+    )
+
+
+def _per_loop(name, factory):
+    loop = asyncio.get_running_loop()
+    clients = _loop_clients.setdefault(loop, {})
+    if name not in clients:
+        clients[name] = factory()
+    return clients[name]
+
+
+def _azure_settings():
+    return {
+        "api_key": st.secrets.get("AZURE_OPENAI_API_KEY"),
+        "api_version": st.secrets.get("AZURE_API_VERSION"),
+        "azure_deployment": st.secrets.get("AZURE_DEPLOYMENT_MODEL"),
+        "azure_endpoint": st.secrets.get("AZURE_ENDPOINT"),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_http_client():
+    """Process-wide pooled HTTP client shared by all sync OpenAI/Azure clients."""
+    import httpx
+
+    return httpx.Client(limits=_http_limits(), timeout=HTTP_TIMEOUT)
+
+
+def get_async_http_client():
+    """Pooled async HTTP client for the current event loop."""
+    import httpx
+
+    return _per_loop(
+        "http", lambda: httpx.AsyncClient(limits=_http_limits(), timeout=HTTP_TIMEOUT)
+    )
+
+
+@lru_cache(maxsize=None)
+def get_azure_llm():
+    """Shared AzureChatOpenAI for sync calls (invoke/stream)."""
+    from langchain_openai import AzureChatOpenAI
+
+    return AzureChatOpenAI(
+        **_azure_settings(), temperature=0.3, http_client=get_http_client()
+    )
+
+
+def get_async_azure_llm():
+    """AzureChatOpenAI for async calls (ainvoke/astream) in the current event loop."""
+    from langchain_openai import AzureChatOpenAI
+
+    return _per_loop(
+        "azure_llm",
+        lambda: AzureChatOpenAI(
+            **_azure_settings(),
+            temperature=0.3,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+        ),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_azure_client():
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(**_azure_settings(), http_client=get_http_client())
+
+
+def get_async_image_client():
+    """AsyncOpenAI image client for the current event loop."""
+    from openai import AsyncOpenAI
+
+    return _per_loop(
+        "image",
+        lambda: AsyncOpenAI(
+            api_key=st.secrets.get("OPENAI_API_KEY"),
+            http_client=get_async_http_client(),
+        ),
+    )